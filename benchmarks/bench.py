@@ -0,0 +1,234 @@
+"""
+Times the lexer, the parser and the interpreter on a set of FCL workloads,
+records their peak memory and compares the results against a saved baseline.
+
+    python benchmarks/bench.py --output baseline.json
+    python benchmarks/bench.py --baseline baseline.json
+
+Exits with 1 when a phase got slower than the baseline by more than --threshold.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from language import *
+from language import __version__
+
+ENGINES = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VM,
+}
+
+PHASES = ("lex", "parse", "optimize", "run")
+
+
+# workloads, each one returns the code of a program scaled by `scale`
+
+def fizzbuzz(scale: float) -> str:
+    return f"""
+for (i, 1, {int(20000 * scale) + 1}, (
+    if (
+        and(eq(mod(i, 3), 0), eq(mod(i, 5), 0)),
+        log("FizzBuzz"),
+        elif(eq(mod(i, 3), 0), log("Fizz")),
+        elif(eq(mod(i, 5), 0), log("Buzz")),
+        log(i)
+    ),
+))
+"""
+
+def nested_for(scale: float) -> str:
+    n = int(150 * scale ** 0.5)
+    return f"""
+total = 0
+for (i, 0, {n}, for (j, 0, {n}, (
+    total = add(total, mul(i, j))
+)))
+log(total)
+"""
+
+def string_add(scale: float) -> str:
+    return f"""
+s = ""
+for (i, 0, {int(20000 * scale)}, (
+    s = add(s, "ab")
+))
+log(len(s))
+"""
+
+def index_len(scale: float) -> str:
+    items = ", ".join(str(i) for i in range(200))
+    return f"""
+items = [{items}]
+total = 0
+for (r, 0, {int(100 * scale)}, for (i, 0, len(items), (
+    total = add(total, index(items, i))
+)))
+log(total)
+"""
+
+def if_elif(scale: float) -> str:
+    clauses = ",\n        ".join(f"elif(eq(m, {k}), a = {k})" for k in range(1, 9))
+    return f"""
+for (i, 0, {int(10000 * scale)}, (
+    m = mod(i, 10)
+    if (eq(m, 0), a = 0,
+        {clauses},
+        a = 9
+    )
+))
+log(a)
+"""
+
+def lexing(scale: float) -> str:
+    lines = []
+    for i in range(int(20000 * scale)):
+        lines.append(f"# statement {i}")
+        lines.append(f"v{i % 100} = add({i}, mul(2.5, len(\"some text {i}\"))) # trailing comment")
+    return "\n".join(lines) + "\n"
+
+WORKLOADS = {
+    "fizzbuzz": fizzbuzz,
+    "nested_for": nested_for,
+    "string_add": string_add,
+    "index_len": index_len,
+    "if_elif": if_elif,
+    "lexing": lexing,
+}
+
+
+def run_phases(code: str, name: str, engine, optimizer: Optimizer | None, timings: dict | None = None, peaks: dict | None = None):
+    """Lex, parse, optimize and run `code` once, adding the time and peak memory of every phase"""
+
+    def phase(key, func):
+        if peaks is not None:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings[key] = min(timings.get(key, elapsed), elapsed)
+        if peaks is not None:
+            peaks[key] = tracemalloc.get_traced_memory()[1]
+        return result
+
+    lexer = Lexer(code, name)
+    phase("lex", lexer.tokenize)
+    ast = phase("parse", Parser(lexer).parse)
+    if optimizer is not None:
+        ast = phase("optimize", lambda: optimizer.optimize(ast))
+    interp = engine(ast)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        phase("run", interp.run)
+    return len(lexer.tokens)
+
+
+def bench(names: list[str], engine_name: str, scale: float, repeat: int, optimize: bool, memory: bool) -> dict:
+    results = {}
+    engine = ENGINES[engine_name]
+    for name in names:
+        code = WORKLOADS[name](scale)
+        timings = {}
+        for _ in range(repeat):
+            optimizer = Optimizer() if optimize else None
+            tokens = run_phases(code, name, engine, optimizer, timings)
+
+        result = {"tokens": tokens, "time": timings}
+        if memory:
+            peaks = {}
+            tracemalloc.start()
+            try:
+                run_phases(code, name, engine, Optimizer() if optimize else None, peaks=peaks)
+            finally:
+                tracemalloc.stop()
+            result["peak_memory"] = peaks
+
+        results[name] = result
+        print(f"{name:<12} " + " ".join(f"{key} {value * 1000:9.2f}ms" for key, value in timings.items()), file=sys.stderr)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta: float) -> list[str]:
+    """Print the changes against `baseline` and return the phases that regressed"""
+    regressions = []
+    print(f"{'engine':<8} {'workload':<12} {'phase':<9} {'baseline':>12} {'now':>12} {'change':>8}")
+    for engine, workloads in results["engines"].items():
+        base_workloads = baseline.get("engines", {}).get(engine, {})
+        for name, result in workloads.items():
+            base = base_workloads.get(name)
+            if base is None:
+                continue
+            for phase in PHASES:
+                if phase not in result["time"] or phase not in base["time"]:
+                    continue
+                old = base["time"][phase]
+                new = result["time"][phase]
+                change = (new - old) / old if old else 0.0
+                slower = change > threshold and new - old > min_delta
+                mark = "  REGRESSION" if slower else ""
+                print(f"{engine:<8} {name:<12} {phase:<9} {old * 1000:>10.2f}ms {new * 1000:>10.2f}ms {change:>+8.1%}{mark}")
+                if slower:
+                    regressions.append(f"{engine}/{name}/{phase}")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("workloads", nargs="*", help=f"workloads to run, {', '.join(WORKLOADS)} (default: all)")
+    arg_parser.add_argument("--engines", default="tree", help="comma separated engines to run, tree, closure or vm (default: tree)")
+    arg_parser.add_argument("-O", "--optimize", action="store_true", help="run the optimizer passes before running")
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="multiplies the size of every workload")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per workload, the fastest time is kept")
+    arg_parser.add_argument("--no-memory", action="store_true", help="skip the traced run that measures peak memory")
+    arg_parser.add_argument("--output", help="write the results as json to this file")
+    arg_parser.add_argument("--baseline", help="json results of an earlier run to compare against")
+    arg_parser.add_argument("--threshold", type=float, default=0.10, help="slowdown counted as a regression (default: 0.10)")
+    arg_parser.add_argument("--min-delta", type=float, default=0.005,
+                            help="slowdowns shorter than this many seconds are noise (default: 0.005)")
+    args = arg_parser.parse_args()
+
+    names = args.workloads or list(WORKLOADS)
+    for name in names:
+        if name not in WORKLOADS:
+            arg_parser.error(f"unknown workload '{name}', expected one of {', '.join(WORKLOADS)}")
+    engines = [name.strip() for name in args.engines.split(",") if name.strip()]
+    for engine in engines:
+        if engine not in ENGINES:
+            arg_parser.error(f"unknown engine '{engine}', expected one of {', '.join(ENGINES)}")
+
+    results = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "scale": args.scale,
+        "optimize": args.optimize,
+        "engines": {},
+    }
+    for engine in engines:
+        print(f"engine {engine}", file=sys.stderr)
+        results["engines"][engine] = bench(names, engine, args.scale, args.repeat, args.optimize, not args.no_memory)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale or baseline.get("optimize") != args.optimize:
+            print("warning: the baseline was run with a different --scale or -O", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Memory used by the lexer's tokens and the parser's ast, in bytes per token and per node.
+
+    python benchmarks/memory.py [file.fcl] [--statements N]
+
+Without a file it measures a generated program of N statements.
+Bytes per node include the tokens the nodes keep for error messages.
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from language import *
+
+
+def generate(statements: int) -> str:
+    lines = []
+    for i in range(statements):
+        lines.append(f"x{i % 50} = add({i}, mul(2, 'str {i}'))")
+        lines.append(f"if(eq(x{i % 50}, [1, 2.5, true]), log(\"yes\"), elif(false, log(x{i % 50})), (log(1) log(2)))")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("filename", nargs="?")
+    arg_parser.add_argument("--statements", type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    if args.filename:
+        file_name = args.filename
+        code = open(file_name, "r").read()
+    else:
+        file_name = "<generated>"
+        code = generate(args.statements)
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+
+    lexer = Lexer(code, file_name)
+    lexer.tokenize()
+    tokens = len(lexer.tokens)
+    token_bytes = tracemalloc.get_traced_memory()[0] - base
+
+    # the nodes keep the tokens they were parsed from, everything else goes with the lexer
+    ast = Parser(lexer).parse()
+    del lexer
+    node_bytes = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    nodes = count_nodes(ast)
+
+    print(f"{'source':<8} {len(code):>12} bytes")
+    print(f"{'tokens':<8} {tokens:>12} {token_bytes:>12} bytes {token_bytes / tokens:>8.1f} bytes/token")
+    print(f"{'nodes':<8} {nodes:>12} {node_bytes:>12} bytes {node_bytes / nodes:>8.1f} bytes/node")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from language import *
+import argparse
+import json
+import sys
+
+ENGINES = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VM,
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser(prog="batch.py", description="Run many FCL programs in a pool of worker processes.")
+    arg_parser.add_argument("paths", nargs="+", help="files to run, directories are searched for .fcl files")
+    arg_parser.add_argument("--engine", choices=ENGINES.keys(), default="tree", help="interpreter running the programs")
+    arg_parser.add_argument("-O", "--optimize", action="store_true", help="run the optimizer passes before running every program")
+    arg_parser.add_argument("--passes", default=",".join(Optimizer.PASSES),
+                            help="comma separated optimizer passes run with -O (default: all)")
+    arg_parser.add_argument("--workers", type=int, help="worker processes (default: one per cpu)")
+    arg_parser.add_argument("--show-output", action="store_true", help="print the output of every program after its name")
+    arg_parser.add_argument("--json", metavar="FILE", help="write every program's output, exit code and metrics as json to this file")
+    args = arg_parser.parse_args()
+
+    passes = None
+    if args.optimize:
+        passes = [name.strip() for name in args.passes.split(",") if name.strip()]
+        try:
+            passes = Optimizer(passes).passes
+        except ValueError as e:
+            arg_parser.error(str(e))
+    if args.workers is not None and args.workers < 1:
+        arg_parser.error("--workers must be at least 1")
+
+    def show(result: FileResult):
+        print(f"==> {result.path} <==")
+        sys.stdout.write(result.stdout)
+        if result.error is not None:
+            print(result.error)
+
+    report = run_batch(args.paths, ENGINES[args.engine], passes, args.workers, show if args.show_output else None)
+    print(report.summary(), file=sys.stderr)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": report.as_dict(), "files": [result.as_dict() for result in report.results]}, f, indent=2)
+
+    if report.failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
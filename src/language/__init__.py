@@ -1,3 +1,19 @@
+__version__ = "0.5.1"
+
+from .errors import *
 from .interpreter import *
+from .builtins import *
+from .resolver import *
+from .closures import *
+from .bytecode import *
+from .optimizer import *
 from .lexer import *
-from .pparser import *
\ No newline at end of file
+from .pparser import *
+from .cache import *
+from .profiler import *
+from .runner import *
+from .output import *
+from .values import *
+from .parallel import *
+from .batch import *
+from .inline_cache import *
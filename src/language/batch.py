@@ -0,0 +1,147 @@
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .interpreter import Interpreter
+from .optimizer import Optimizer
+from .runner import *
+
+
+class FileResult:
+    """Outcome of one file of a batch: its exit code, everything it printed and its run metrics"""
+
+    def __init__(self, path: str, exit_code: int, stdout: str, metrics: RunMetrics | None, wall_time: float, error: str = None):
+        self.path = path
+        self.exit_code = exit_code
+        self.stdout = stdout
+        self.metrics = metrics
+        self.wall_time = wall_time
+        # crash that didn't go through the interpreter's error messages (unreadable file, python exception)
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "exit_code": self.exit_code,
+            "stdout": self.stdout,
+            "wall_time": self.wall_time,
+            "error": self.error,
+            "metrics": None if self.metrics is None else self.metrics.as_dict(),
+        }
+
+    def __repr__(self):
+        return f"FileResult(path={self.path!r}, exit_code={self.exit_code}, wall_time={self.wall_time})"
+
+
+class BatchReport:
+    """Results of run_batch in the order the files were given, with the throughput of the whole batch"""
+
+    def __init__(self, results: list[FileResult], wall_time: float, workers: int):
+        self.results = results
+        self.wall_time = wall_time
+        self.workers = workers
+
+    @property
+    def failed(self) -> list[FileResult]:
+        return [result for result in self.results if not result.ok]
+
+    def as_dict(self) -> dict:
+        busy = sum(result.wall_time for result in self.results)
+        tokens = sum(result.metrics.tokens for result in self.results if result.metrics is not None)
+        return {
+            "files": len(self.results),
+            "failed": len(self.failed),
+            "workers": self.workers,
+            "wall_time": self.wall_time,
+            # time spent running files summed over the workers
+            "busy_time": busy,
+            "files_per_second": len(self.results) / self.wall_time if self.wall_time else 0.0,
+            "tokens_per_second": tokens / self.wall_time if self.wall_time else 0.0,
+        }
+
+    def summary(self) -> str:
+        """One line per file and the totals"""
+        lines = [f"{'status':<8} {'wall (ms)':>10} {'run (ms)':>10} {'tokens':>8}  file"]
+        for result in self.results:
+            status = "ok" if result.ok else f"exit {result.exit_code}"
+            metrics = result.metrics
+            run_time = f"{metrics.total_time * 1000:>10.2f}" if metrics is not None else f"{'-':>10}"
+            tokens = metrics.tokens if metrics is not None else "-"
+            lines.append(f"{status:<8} {result.wall_time * 1000:>10.2f} {run_time} {tokens:>8}  {result.path}")
+
+        totals = self.as_dict()
+        lines.append("")
+        lines.append(f"{totals['files']} files, {totals['failed']} failed, {totals['workers']} workers, "
+                     f"{totals['wall_time']:.3f}s ({totals['files_per_second']:.1f} files/s, "
+                     f"{totals['tokens_per_second']:.0f} tokens/s)")
+        return "\n".join(lines)
+
+
+def collect_files(paths: list[str], suffix: str = ".fcl") -> list[str]:
+    """`paths` with every directory replaced by the `suffix` files under it, sorted"""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        found = []
+        for root, dirs, names in os.walk(path):
+            # skip the .fclc cache and other hidden directories
+            dirs[:] = [name for name in dirs if not name.startswith((".", "__"))]
+            found += [os.path.join(root, name) for name in names if name.endswith(suffix)]
+        files += sorted(found)
+    return files
+
+
+# what every worker runs its files with, set once by init_worker
+worker_settings: tuple = (Interpreter, None)
+
+def init_worker(engine, passes):
+    global worker_settings
+    worker_settings = (engine, passes)
+    # the pool already uses every cpu
+    Interpreter.pfor_workers = 1
+    # a script waiting for input would hang its worker, it reads end of file instead
+    sys.stdin = open(os.devnull)
+
+def run_file(path: str) -> FileResult:
+    """Run one file with the worker's settings, capturing its output"""
+    engine, passes = worker_settings
+    stdout = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with open(path, "r") as f:
+            code = f.read()
+        optimizer = Optimizer(passes) if passes is not None else None
+        result = run_source(code, path, engine, optimizer=optimizer, stdout=stdout)
+        return FileResult(path, result.exit_code, stdout.getvalue(), result.metrics, time.perf_counter() - start)
+    except Exception as e:
+        return FileResult(path, 1, stdout.getvalue(), None, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+
+
+def run_batch(paths: list[str], engine=Interpreter, passes: list[str] | None = None, workers: int = None, callback=None) -> BatchReport:
+    """
+    Run every file in `paths` (directories are searched for .fcl files) in a pool of
+    worker processes. Workers are started once and keep their imported modules,
+    every file only pays for lexing, parsing and running it.
+    `passes` are the optimizer passes to run, None to not optimize.
+    `callback` is called with each FileResult in order, as the results come in.
+    """
+    files = collect_files(paths)
+    workers = min(workers or os.cpu_count() or 1, max(len(files), 1))
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(engine, passes)) as pool:
+        # small files, several of them per round trip to a worker
+        chunksize = max(1, len(files) // (workers * 8))
+        for result in pool.map(run_file, files, chunksize=chunksize):
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    return BatchReport(results, time.perf_counter() - start, workers)
@@ -0,0 +1,321 @@
+import operator
+
+from .pparser import *
+from .values import *
+
+
+ARITH_OPS = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "div": operator.truediv,
+    "mod": operator.mod,
+    "pow": pow,
+}
+# arithmetic functions failing on a second operand of zero
+DIVISIONS = ("div", "mod")
+
+COMPARE_OPS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+
+class Builtin:
+    """
+    A function callable from fcl code, `func` is called as func(interp, args, node).
+    Strict builtins get their arguments evaluated, non strict (syntax level) ones
+    like 'for' and 'if' get the argument nodes and evaluate them themselves.
+    """
+
+    def __init__(self, name: str, func, arity: int = None, exact: bool = True, strict: bool = True):
+        self.name = name
+        self.func = func
+        self.arity = arity
+        self.exact = exact
+        self.strict = strict
+
+    def __repr__(self):
+        return f"Builtin({self.name}, arity={self.arity}, exact={self.exact}, strict={self.strict})"
+
+    def accepts(self, arg_len: int) -> bool:
+        if self.arity is None:
+            return True
+        elif self.exact:
+            return arg_len == self.arity
+        else:
+            return arg_len >= self.arity
+
+
+class BuiltinRegistry:
+    """Maps function names to builtins, every Interpreter resolves its function calls through one"""
+
+    def __init__(self, builtins: dict = None):
+        self.functions: dict[str, Builtin] = dict(builtins) if builtins else {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.functions
+
+    def __iter__(self):
+        return iter(self.functions.values())
+
+    def get(self, name: str) -> Builtin | None:
+        return self.functions.get(name)
+
+    def register(self, name: str, func=None, arity: int = None, exact: bool = True, strict: bool = True):
+        """
+        Register `func` under `name`, replacing any existing builtin with that name.
+        Without `func` it returns a decorator:
+
+            @registry.register("double", arity=1)
+            def double(interp, args, node):
+                return args[0] * 2
+        """
+        if func is None:
+            return lambda func: self.register(name, func, arity, exact, strict)
+
+        self.functions[name] = Builtin(name, func, arity, exact, strict)
+        return func
+
+    def unregister(self, name: str):
+        self.functions.pop(name, None)
+
+    def copy(self):
+        return BuiltinRegistry(self.functions)
+
+
+# default registry used by every interpreter unless another one is given
+BUILTINS = BuiltinRegistry()
+
+def register_builtin(name: str, func=None, arity: int = None, exact: bool = True, strict: bool = True):
+    """Register a native builtin in the default registry, see BuiltinRegistry.register"""
+    return BUILTINS.register(name, func, arity, exact, strict)
+
+
+# syntax level functions
+
+@register_builtin("for", arity=3, exact=False, strict=False)
+def builtin_for(interp, args, node):
+    # syntax for(var name: Identifier, start: integer, end: integer, *expressions)
+    return interp.run_for(args, node)
+
+@register_builtin("pfor", arity=3, exact=False, strict=False)
+def builtin_pfor(interp, args, node):
+    # syntax pfor(var name: Identifier, start: integer, end: integer, *expressions)
+    # runs the iterations in worker processes, returns the value of every iteration
+    return interp.run_pfor(args, node)
+
+@register_builtin("foreach", arity=3, exact=False, strict=False)
+def builtin_foreach(interp, args, node):
+    # syntax foreach(var name: Identifier, values: list | string | sequence, *expressions)
+    return interp.run_foreach(args, node)
+
+@register_builtin("var", arity=2, strict=False)
+def builtin_var(interp, args, node):
+    # syntax var(name: Identifier, value: any)
+    return interp.run_var(args, node)
+
+@register_builtin("if", arity=2, exact=False, strict=False)
+def builtin_if(interp, args, node):
+    return interp.run_if(args, node)
+
+@register_builtin("elif", arity=2, strict=False)
+def builtin_elif(interp, args, node):
+    return ElifNode(args[0], args[1], node.tok)
+
+
+# normal functions
+
+@register_builtin("log")
+def builtin_log(interp, args, node):
+    try:
+        values = [format_value(value) for value in args]
+    except ValueError:
+        interp.digits_error(node)
+    interp.output.write(" ".join(values) + "\n")
+
+def builtin_arithmetic(interp, args, node):
+    return interp.run_arithmetic_op(node.func_name, args, node)
+
+def builtin_conditional(interp, args, node):
+    return interp.run_conditionals(node.func_name, args, node)
+
+for name in ARITH_OPS:
+    register_builtin(name, builtin_arithmetic, arity=2)
+
+for name in ("eq", "neq", *COMPARE_OPS):
+    register_builtin(name, builtin_conditional, arity=2)
+
+@register_builtin("str", arity=1)
+def builtin_str(interp, args, node):
+    # ropes are already strings, they aren't joined here
+    if type(args[0]) is Rope:
+        return args[0]
+    try:
+        return format_value(args[0])
+    except ValueError:
+        interp.digits_error(node)
+
+@register_builtin("index", arity=2)
+def builtin_index(interp, args, node):
+    # index lists and str
+    if not isinstance(args[0], (ListValue, str, Rope)):
+        interp.eprint(f"'index' function only accepts string or list as it's first argument.\n{node.tok}", node.tok)
+
+    if type(args[1]) is not int:
+        interp.eprint(f"'index' function only accepts integer as it's first argument.\n{node.tok}", node.tok)
+
+    # negative indexes count from the end
+    indx = args[1]
+    if not -len(args[0]) <= indx < len(args[0]):
+        interp.eprint(f"index out of bounds.\n{node.tok}", node.tok)
+
+    return args[0][indx]
+
+@register_builtin("len", arity=1)
+def builtin_len(interp, args, node):
+    if not isinstance(args[0], (str, ListValue, Rope)):
+        interp.eprint(f"'len' function only takes string or list as it's first argument.\n{node.tok}", node.tok)
+    return len(args[0])
+
+@register_builtin("input", arity=1)
+def builtin_input(interp, args, node):
+    if not isinstance(args[0], (str, Rope)):
+        interp.eprint(f"'input' function takes string as an argument\n{node.tok}", node.tok)
+
+    # the prompt goes where 'log' writes, after everything logged before it
+    interp.output.write(str(args[0]))
+    interp.output.flush()
+    try:
+        return input()
+    except EOFError:
+        interp.eprint(f"'input' function reached the end of the input.\n{node.tok}", node.tok)
+
+@register_builtin("concat", arity=1, exact=False)
+def builtin_concat(interp, args, node):
+    # syntax concat(string, ...), the strings one after the other
+    if not all(isinstance(arg, (str, Rope)) for arg in args):
+        interp.eprint(f"'concat' function only takes strings.\n{node.tok}", node.tok)
+
+    text = args[0]
+    for arg in args[1:]:
+        text = concat(text, arg)
+    return text
+
+@register_builtin("join", arity=2)
+def builtin_join(interp, args, node):
+    # syntax join(strings: list | sequence, separator: string)
+    parts, separator = args
+    if not isinstance(parts, (ListValue, Sequence)):
+        interp.eprint(f"'join' function takes a list or a sequence as it's first argument.\n{node.tok}", node.tok)
+    if not isinstance(separator, (str, Rope)):
+        interp.eprint(f"'join' function takes a string as it's second argument.\n{node.tok}", node.tok)
+
+    parts = [str(part) if type(part) is Rope else part for part in parts]
+    if not all(type(part) is str for part in parts):
+        interp.eprint(f"'join' function only joins strings.\n{node.tok}", node.tok)
+    return str(separator).join(parts)
+
+def builtin_logical(interp, args, node):
+    # syntax and(*expressions), or(*expressions), the expressions after the one deciding the result aren't evaluated
+    return interp.run_logical(node.func_name, args, node)
+
+register_builtin("and", builtin_logical, arity=2, exact=False, strict=False)
+register_builtin("or", builtin_logical, arity=2, exact=False, strict=False)
+
+
+# bulk functions, lists of numbers are handled by NumPy when it's installed
+
+@register_builtin("range", arity=1, exact=False)
+def builtin_range(interp, args, node):
+    # syntax range(end), range(start, end) or range(start, end, step)
+    return ListValue.from_range(*range_bounds(interp, args, node))
+
+def range_bounds(interp, args, node) -> tuple[int, int, int]:
+    """Start, end and step of a 'range' call, 'foreach' iterates them without creating the list"""
+    if len(args) > 3:
+        interp.eprint(f"'range' function takes at most 3 arguments, {len(args)} were given.\n{node.tok}", node.tok)
+    if not all(type(arg) is int for arg in args):
+        interp.eprint(f"'range' function only takes integers as arguments.\n{node.tok}", node.tok)
+    if len(args) == 3 and args[2] == 0:
+        interp.eprint(f"'range' function's step can't be 0.\n{node.tok}", node.tok)
+
+    if len(args) == 1:
+        return 0, args[0], 1
+    return args[0], args[1], args[2] if len(args) == 3 else 1
+
+def is_range_call(node: Node, builtins: BuiltinRegistry) -> bool:
+    """`node` calls the 'range' builtin with a valid number of arguments"""
+    if not isinstance(node, FunctionCallNode) or node.func_name != "range":
+        return False
+    builtin = builtins.get("range")
+    return builtin is not None and builtin.func is builtin_range and builtin.accepts(len(node.args))
+
+@register_builtin("lines", arity=1)
+def builtin_lines(interp, args, node):
+    # syntax lines(path), the lines of the file without their line breaks, read as they are iterated
+    path = str(args[0]) if type(args[0]) is Rope else args[0]
+    if not isinstance(path, str):
+        interp.eprint(f"'lines' function takes a string as it's first argument.\n{node.tok}", node.tok)
+    return Sequence(f"lines {path}", lambda: read_lines(interp, path, node))
+
+def read_lines(interp, path: str, node):
+    try:
+        file = open(path, "r")
+    except OSError as e:
+        interp.eprint(f"'lines' function can't read '{path}': {e.strerror}.\n{node.tok}", node.tok)
+
+    with file:
+        for line in file:
+            yield line[:-1] if line.endswith("\n") else line
+
+@register_builtin("sum", arity=1)
+def builtin_sum(interp, args, node):
+    if not isinstance(args[0], ListValue):
+        interp.eprint(f"'sum' function takes a list as it's first argument.\n{node.tok}", node.tok)
+
+    try:
+        total = args[0].sum()
+    except OverflowError:
+        interp.eprint(f"'sum' function's result is too large for a float.\n{node.tok}", node.tok)
+    if total is NotImplemented:
+        interp.eprint(f"'sum' function only works on lists of numbers.\n{node.tok}", node.tok)
+    return total
+
+def builtin_extreme(interp, args, node):
+    # syntax min(list) or min(value, value, ...)
+    largest = node.func_name == "max"
+    if len(args) == 1:
+        if not isinstance(args[0], ListValue):
+            interp.eprint(f"'{node.func_name}' function takes a list or at least 2 values.\n{node.tok}", node.tok)
+        if len(args[0]) == 0:
+            interp.eprint(f"'{node.func_name}' function got an empty list.\n{node.tok}", node.tok)
+        value = args[0].extreme(largest)
+    else:
+        value = extreme(args, largest)
+
+    if value is NotImplemented:
+        interp.eprint(f"'{node.func_name}' function only compares numbers or strings.\n{node.tok}", node.tok)
+    return value
+
+register_builtin("min", builtin_extreme, arity=1, exact=False)
+register_builtin("max", builtin_extreme, arity=1, exact=False)
+
+@register_builtin("filter", arity=2)
+def builtin_filter(interp, args, node):
+    # syntax filter(list, mask), keeps the elements whose mask value is true, filter(xs, gt(xs, 0))
+    values, mask = args
+    if not isinstance(values, ListValue) or not isinstance(mask, ListValue):
+        interp.eprint(f"'filter' function takes two lists as arguments.\n{node.tok}", node.tok)
+    if len(values) != len(mask):
+        interp.eprint(f"'filter' function takes lists of the same length, the lengths were {len(values)} and {len(mask)}.\n{node.tok}", node.tok)
+
+    keep = [bool(keep) for keep in mask]
+    texts = values.texts
+    if texts is not None:
+        texts = [text for text, kept in zip(texts, keep) if kept]
+    return ListValue.from_values([value for value, kept in zip(values, keep) if kept], texts)
+
+del name
@@ -0,0 +1,503 @@
+from array import array
+from enum import IntEnum, auto
+
+from .builtins import *
+from .interpreter import Interpreter
+from .pparser import *
+from .resolver import *
+
+
+class Op(IntEnum):
+    LOAD_CONST = auto()
+    LOAD_VAR = auto()
+    STORE_VAR = auto()
+    STORE_THUNK = auto() # bind the expression node on the stack lazily as a Thunk, which replaces it
+    DELETE_VAR = auto() # unset the slot
+    POP = auto()
+    JUMP = auto()
+    JUMP_IF_FALSY = auto() # if and elif conditions, 'and' arguments
+    JUMP_IF_TRUTHY = auto() # 'or' arguments
+    FOR_PREP = auto()
+    EACH_PREP = auto() # arg is the number of range(...) arguments on the stack, 0 for a list, string or sequence
+    FOR_ITER = auto()
+    STORE_LOOP = auto()
+    ARITH = auto()
+    COMPARE = auto()
+    LOG = auto()
+    BUILD_LIST = auto() # arg is the number of elements on the stack
+    CALL = auto() # arg is the builtin in the constants table
+    FALLBACK = auto() # evaluate the instruction's node with the tree walker
+    ERROR = auto()
+    RETURN = auto()
+
+
+ARITH_NAMES = list(ARITH_OPS.keys())
+COMPARE_NAMES = ["eq", "neq"] + list(COMPARE_OPS.keys())
+
+# ops whose argument is an absolute jump target
+JUMP_OPS = (Op.JUMP, Op.JUMP_IF_FALSY, Op.JUMP_IF_TRUTHY, Op.FOR_ITER)
+
+
+class CodeObject:
+    """
+    Compiled program, instructions are stored as (op, arg) pairs in `code`
+    and `nodes` keeps the ast node of every instruction for error reporting.
+    Variables are referenced by their frame slot, `names` maps slots back to names.
+    """
+
+    def __init__(self, file_path: str = None):
+        self.file_path = file_path
+        self.code = array("i")
+        self.consts = []
+        self.names = []
+        self.nodes = []
+
+    def __repr__(self):
+        return f"CodeObject<{hex(id(self))}>({len(self.nodes)} instructions)"
+
+
+class BytecodeCompiler:
+
+    # statements nested deeper are left to the tree walker, compiling them would recurse too deep
+    max_depth = Interpreter.max_depth
+
+    def __init__(self, builtins: BuiltinRegistry = None, resolver: Resolver = None):
+        self.builtins = BUILTINS if builtins is None else builtins
+        self.resolver = Resolver() if resolver is None else resolver
+        self.co: CodeObject = None
+        self.const_indices = {}
+
+    def compile(self, ast: Program) -> CodeObject:
+        self.co = CodeObject(ast.tok.start_loc.file_path)
+        self.co.names = self.resolver.names
+        self.const_indices = {}
+
+        for i, stat in enumerate(ast.statements):
+            if i != 0:
+                self.emit(Op.POP, 0, stat)
+            if nesting_depth(stat) > self.max_depth:
+                self.emit(Op.FALLBACK, 0, stat)
+            else:
+                self.compile_node(stat)
+        if len(ast.statements) == 0:
+            self.emit(Op.LOAD_CONST, self.const(None), ast)
+        self.emit(Op.RETURN, 0, ast)
+        return self.co
+
+    def emit(self, op: Op, arg: int, node: Node) -> int:
+        """Append an instruction and return its position"""
+        pos = len(self.co.code)
+        self.co.code.append(op)
+        self.co.code.append(arg)
+        self.co.nodes.append(node)
+        return pos
+
+    def patch(self, pos: int, target: int = None):
+        """Point the jump at `pos` to `target`, defaults to the next instruction"""
+        self.co.code[pos + 1] = len(self.co.code) if target is None else target
+
+    def const(self, value) -> int:
+        # numbers and strings are shared, everything else (nodes, lists) is kept as is
+        key = (type(value), value) if isinstance(value, (int, float, str)) else id(value)
+        if key not in self.const_indices:
+            self.const_indices[key] = len(self.co.consts)
+            self.co.consts.append(value)
+        return self.const_indices[key]
+
+    def name(self, name: str) -> int:
+        return self.resolver.slot(name)
+
+    def compile_sequence(self, nodes: list[Node], parent: Node):
+        """Compile expressions leaving only the value of the last one on the stack"""
+        if len(nodes) == 0:
+            self.emit(Op.LOAD_CONST, self.const(None), parent)
+            return
+
+        for i, node in enumerate(nodes):
+            if i != 0:
+                self.emit(Op.POP, 0, node)
+            self.compile_node(node)
+
+    def compile_node(self, node: Node):
+        if isinstance(node, BlockNode):
+            self.compile_sequence(node.statements, node)
+        elif isinstance(node, (ConstNode, StringNode)):
+            self.emit(Op.LOAD_CONST, self.const(node.value), node)
+        elif isinstance(node, NumberNode):
+            try:
+                value = float(node.value) if "." in node.value else int(node.value)
+            except ValueError:
+                # let it fail at runtime like the tree walker does
+                self.emit(Op.FALLBACK, 0, node)
+            else:
+                self.emit(Op.LOAD_CONST, self.const(value), node)
+        elif isinstance(node, ListNode):
+            for value in node.values:
+                self.compile_node(value)
+            self.emit(Op.BUILD_LIST, len(node.values), node)
+        elif isinstance(node, BoolNode):
+            self.emit(Op.LOAD_CONST, self.const(node.value), node)
+        elif isinstance(node, AssignmentNode):
+            self.compile_node(node.expr)
+            self.emit(Op.STORE_VAR, self.name(node.var_name), node)
+        elif isinstance(node, VarAccessNode):
+            self.emit(Op.LOAD_VAR, self.name(node.var_name), node)
+        elif isinstance(node, FunctionCallNode):
+            self.compile_function_call(node)
+        else:
+            self.emit(Op.FALLBACK, 0, node)
+
+    def compile_function_call(self, node: FunctionCallNode):
+        builtin = self.builtins.get(node.func_name)
+        if builtin is None or not builtin.accepts(len(node.args)):
+            # reports the missing function or the wrong number of arguments
+            self.emit(Op.FALLBACK, 0, node)
+            return
+
+        func = builtin.func
+
+        # syntax level functions
+        if not builtin.strict:
+            if func is builtin_for:
+                self.compile_for(node)
+            elif func is builtin_foreach:
+                self.compile_foreach(node)
+            elif func is builtin_var:
+                self.compile_var(node)
+            elif func is builtin_if:
+                self.compile_if(node)
+            elif func is builtin_logical:
+                self.compile_logical(node)
+            else:
+                self.emit(Op.FALLBACK, 0, node)
+            return
+
+        for arg in node.args:
+            self.compile_node(arg)
+
+        # normal functions
+        if func is builtin_log:
+            self.emit(Op.LOG, len(node.args), node)
+        elif func is builtin_arithmetic:
+            self.emit(Op.ARITH, ARITH_NAMES.index(node.func_name), node)
+        elif func is builtin_conditional:
+            self.emit(Op.COMPARE, COMPARE_NAMES.index(node.func_name), node)
+        else:
+            self.emit(Op.CALL, self.const(builtin), node)
+
+    def compile_for(self, node: FunctionCallNode):
+        args = node.args
+        if not isinstance(args[0], VarAccessNode):
+            self.emit(Op.FALLBACK, 0, node)
+            return
+
+        identifier = self.name(args[0].var_name)
+        self.compile_node(args[1])
+        self.compile_node(args[2])
+        self.emit(Op.FOR_PREP, 0, node)
+        loop_start = self.emit(Op.FOR_ITER, 0, node)
+        self.emit(Op.STORE_LOOP, identifier, node)
+        for expr in args[3:]:
+            self.compile_node(expr)
+            self.emit(Op.POP, 0, expr)
+        self.emit(Op.JUMP, loop_start, node)
+        self.patch(loop_start)
+        self.emit(Op.DELETE_VAR, identifier, node)
+        self.emit(Op.LOAD_CONST, self.const(None), node)
+
+    def compile_foreach(self, node: FunctionCallNode):
+        args = node.args
+        if not isinstance(args[0], VarAccessNode):
+            self.emit(Op.FALLBACK, 0, node)
+            return
+
+        identifier = self.name(args[0].var_name)
+        source = args[1]
+        if is_range_call(source, self.builtins):
+            for arg in source.args:
+                self.compile_node(arg)
+            self.emit(Op.EACH_PREP, len(source.args), node)
+        else:
+            self.compile_node(source)
+            self.emit(Op.EACH_PREP, 0, node)
+        loop_start = self.emit(Op.FOR_ITER, 0, node)
+        self.emit(Op.STORE_LOOP, identifier, node)
+        for expr in args[2:]:
+            self.compile_node(expr)
+            self.emit(Op.POP, 0, expr)
+        self.emit(Op.JUMP, loop_start, node)
+        self.patch(loop_start)
+        self.emit(Op.DELETE_VAR, identifier, node)
+        self.emit(Op.LOAD_CONST, self.const(None), node)
+
+    def compile_var(self, node: FunctionCallNode):
+        args = node.args
+        if not isinstance(args[0], VarAccessNode):
+            self.emit(Op.FALLBACK, 0, node)
+            return
+
+        self.emit(Op.LOAD_CONST, self.const(args[1]), node)
+        self.emit(Op.STORE_THUNK, self.name(args[0].var_name), node)
+
+    def compile_if(self, node: FunctionCallNode):
+        args = node.args
+        end_jumps = []
+        self.compile_node(args[0])
+        else_jump = self.emit(Op.JUMP_IF_FALSY, 0, node)
+        self.compile_node(args[1])
+        end_jumps.append(self.emit(Op.JUMP, 0, node))
+        self.patch(else_jump)
+
+        clauses = args[2:]
+        has_else = False
+        # elif arguments are checked before any of the conditions are evaluated
+        bad_elif = [clause for clause in clauses if self.is_elif(clause) and len(clause.args) != 2]
+        if bad_elif:
+            self.emit(Op.FALLBACK, 0, bad_elif[0])
+            has_else = True
+            clauses = []
+
+        for clause in clauses:
+            if self.is_elif(clause):
+                self.compile_node(clause.args[0])
+                next_jump = self.emit(Op.JUMP_IF_FALSY, 0, clause)
+                self.compile_node(clause.args[1])
+                end_jumps.append(self.emit(Op.JUMP, 0, clause))
+                self.patch(next_jump)
+            elif clause is args[-1]:
+                self.compile_node(clause)
+                has_else = True
+            else:
+                self.emit(Op.ERROR, self.const(f"Invalid Syntax in {clause.tok}"), clause)
+                has_else = True
+                break
+
+        if not has_else:
+            self.emit(Op.LOAD_CONST, self.const(None), node)
+
+        for jump in end_jumps:
+            self.patch(jump)
+
+    def compile_logical(self, node: FunctionCallNode):
+        """'and' and 'or' jump to their result as soon as an argument decides it"""
+        is_and = node.func_name == "and"
+        jump_op = Op.JUMP_IF_FALSY if is_and else Op.JUMP_IF_TRUTHY
+        jumps = []
+        for arg in node.args:
+            self.compile_node(arg)
+            jumps.append(self.emit(jump_op, 0, arg))
+
+        self.emit(Op.LOAD_CONST, self.const(is_and), node)
+        end_jump = self.emit(Op.JUMP, 0, node)
+        for jump in jumps:
+            self.patch(jump)
+        self.emit(Op.LOAD_CONST, self.const(not is_and), node)
+        self.patch(end_jump)
+
+    def is_elif(self, node: Node) -> bool:
+        return isinstance(node, FunctionCallNode) and node.func_name == "elif"
+
+
+def disassemble(co: CodeObject) -> str:
+    """Human readable listing of a code object"""
+    lines = []
+    targets = {co.code[pos + 1] for pos in range(0, len(co.code), 2) if co.code[pos] in JUMP_OPS}
+
+    for pos in range(0, len(co.code), 2):
+        op = Op(co.code[pos])
+        arg = co.code[pos + 1]
+        node = co.nodes[pos // 2]
+
+        if op in (Op.LOAD_CONST, Op.ERROR, Op.CALL):
+            detail = repr(co.consts[arg])
+        elif op in (Op.LOAD_VAR, Op.STORE_VAR, Op.STORE_THUNK, Op.DELETE_VAR, Op.STORE_LOOP):
+            detail = co.names[arg]
+        elif op in JUMP_OPS:
+            detail = f"to {arg}"
+        elif op == Op.ARITH:
+            detail = ARITH_NAMES[arg]
+        elif op == Op.COMPARE:
+            detail = COMPARE_NAMES[arg]
+        elif op == Op.FALLBACK:
+            detail = node.func_name if isinstance(node, FunctionCallNode) else type(node).__name__
+        else:
+            detail = ""
+
+        line = node.tok.start_loc.line if node is not None and node.tok is not None else ""
+        marker = ">>" if pos in targets else ""
+        lines.append(f"{line:>5} {marker:>2} {pos:>6} {op.name:<18} {arg:>5} {detail}")
+
+    return "\n".join(lines)
+
+
+class VM(Interpreter):
+    """
+    Runs the program as bytecode on a stack machine instead of walking the ast.
+    Like ClosureInterpreter, it falls back to the tree walker for anything unusual.
+    """
+
+    def __init__(self, ast: Program, builtins: BuiltinRegistry = None, output=None):
+        super().__init__(ast, builtins, output)
+        self.co: CodeObject = None
+
+    def run(self):
+        if self.co is None:
+            self.bind(self.ast)
+            self.co = BytecodeCompiler(self.builtins, self.resolver).compile(self.ast)
+        try:
+            return self.execute(self.co)
+        finally:
+            self.output.flush()
+
+    def prepare(self, stat: Node):
+        program = Program(stat.tok)
+        program.statements.append(stat)
+        co = BytecodeCompiler(self.builtins, self.resolver).compile(program)
+        return lambda: self.execute(co)
+
+    def execute(self, co: CodeObject):
+        code = co.code
+        consts = co.consts
+        nodes = co.nodes
+        frame = self.frame
+        output = self.output
+
+        arith_funcs = [ARITH_OPS[name] for name in ARITH_NAMES]
+        compare_funcs = [None, None] + [COMPARE_OPS[name] for name in COMPARE_NAMES[2:]]
+        numbers = (int, float)
+        divisions = [ARITH_NAMES.index(name) for name in DIVISIONS]
+
+        LOAD_CONST = int(Op.LOAD_CONST)
+        LOAD_VAR = int(Op.LOAD_VAR)
+        STORE_VAR = int(Op.STORE_VAR)
+        STORE_THUNK = int(Op.STORE_THUNK)
+        DELETE_VAR = int(Op.DELETE_VAR)
+        POP = int(Op.POP)
+        JUMP = int(Op.JUMP)
+        JUMP_IF_FALSY = int(Op.JUMP_IF_FALSY)
+        JUMP_IF_TRUTHY = int(Op.JUMP_IF_TRUTHY)
+        FOR_PREP = int(Op.FOR_PREP)
+        EACH_PREP = int(Op.EACH_PREP)
+        FOR_ITER = int(Op.FOR_ITER)
+        STORE_LOOP = int(Op.STORE_LOOP)
+        ARITH = int(Op.ARITH)
+        COMPARE = int(Op.COMPARE)
+        LOG = int(Op.LOG)
+        BUILD_LIST = int(Op.BUILD_LIST)
+        CALL = int(Op.CALL)
+        FALLBACK = int(Op.FALLBACK)
+        ERROR = int(Op.ERROR)
+        RETURN = int(Op.RETURN)
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+
+            if op == LOAD_VAR:
+                value = frame[arg]
+                if value is UNSET:
+                    node = nodes[(pc >> 1) - 1]
+                    self.eprint(f"Variable '{node.var_name}' does not exists: {node.tok}", node.tok)
+                push(self.force(value) if type(value) is Thunk else value)
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == ARITH:
+                val2 = pop()
+                val1 = stack[-1]
+                if type(val1) in numbers and type(val2) in numbers and not (arg in divisions and val2 == 0):
+                    try:
+                        stack[-1] = arith_funcs[arg](val1, val2)
+                    except ArithmeticError:
+                        # overflows are reported by the tree walker
+                        stack[-1] = self.run_arithmetic_op(ARITH_NAMES[arg], [val1, val2], nodes[(pc >> 1) - 1])
+                else:
+                    # strings, division by zero and type errors are handled by the tree walker
+                    stack[-1] = self.run_arithmetic_op(ARITH_NAMES[arg], [val1, val2], nodes[(pc >> 1) - 1])
+            elif op == COMPARE:
+                val2 = pop()
+                val1 = stack[-1]
+                if type(val1) is ListValue or type(val2) is ListValue:
+                    stack[-1] = self.run_conditionals(COMPARE_NAMES[arg], [val1, val2], nodes[(pc >> 1) - 1])
+                elif arg == 0:
+                    stack[-1] = equal(val1, val2)
+                elif arg == 1:
+                    stack[-1] = not equal(val1, val2)
+                elif type(val1) is int and type(val2) is int:
+                    stack[-1] = compare_funcs[arg](val1, val2)
+                else:
+                    stack[-1] = self.run_conditionals(COMPARE_NAMES[arg], [val1, val2], nodes[(pc >> 1) - 1])
+            elif op == POP:
+                pop()
+            elif op == JUMP_IF_FALSY:
+                if not pop():
+                    pc = arg
+            elif op == JUMP_IF_TRUTHY:
+                if pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == FOR_ITER:
+                i = next(stack[-1], UNSET)
+                if i is UNSET:
+                    pop()
+                    pc = arg
+                else:
+                    push(i)
+            elif op == STORE_LOOP:
+                frame[arg] = pop()
+            elif op == STORE_VAR:
+                frame[arg] = stack[-1]
+            elif op == STORE_THUNK:
+                frame[arg] = stack[-1] = self.make_thunk(stack[-1])
+            elif op == LOG:
+                try:
+                    values = [format_value(value) for value in stack[len(stack) - arg:]]
+                except ValueError:
+                    self.digits_error(nodes[(pc >> 1) - 1])
+                del stack[len(stack) - arg:]
+                output.write(" ".join(values) + "\n")
+                push(None)
+            elif op == BUILD_LIST:
+                node = nodes[(pc >> 1) - 1]
+                values = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                push(self.make_list(node, values))
+            elif op == CALL:
+                node = nodes[(pc >> 1) - 1]
+                arg_len = len(stack) - len(node.args)
+                args = stack[arg_len:]
+                del stack[arg_len:]
+                push(consts[arg].func(self, args, node))
+            elif op == FOR_PREP:
+                end_range = pop()
+                start_range = pop()
+                node = nodes[(pc >> 1) - 1]
+                if type(start_range) is not int:
+                    self.eprint(f"'for' function takes an integer as it's second argument, {node.tok}", node.tok)
+                if type(end_range) is not int:
+                    self.eprint(f"'for' function takes an integer as it's third argument, {node.tok}", node.tok)
+                push(iter(range(start_range, end_range)))
+            elif op == EACH_PREP:
+                node = nodes[(pc >> 1) - 1]
+                if arg:
+                    bounds = range_bounds(self, stack[len(stack) - arg:], node.args[1])
+                    del stack[len(stack) - arg:]
+                    push(iter(range(*bounds)))
+                else:
+                    stack[-1] = self.iterable(stack[-1], node)
+            elif op == DELETE_VAR:
+                frame[arg] = UNSET
+            elif op == FALLBACK:
+                push(self.evaluate(nodes[(pc >> 1) - 1]))
+            elif op == ERROR:
+                self.eprint(consts[arg], nodes[(pc >> 1) - 1].tok)
+            elif op == RETURN:
+                return pop()
+            else:
+                self.eprint(f"Invalid instruction {op} at {pc - 2}")
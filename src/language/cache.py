@@ -0,0 +1,154 @@
+import gc
+import hashlib
+import os
+import pickle
+
+from . import __version__
+from .pparser import *
+
+
+class AstCache:
+    """
+    Keeps parsed (and optionally optimized) programs on disk as .fclc files so
+    running an unchanged script skips the lexer and the parser.
+
+    Entries are keyed by the hash of the source, the interpreter version and the
+    optimizer passes, so editing the script or upgrading the interpreter misses
+    the cache. Storing a new entry for a file removes its older ones and the least
+    recently used entries are evicted once the directory grows over `max_bytes`.
+    """
+
+    MAGIC = b"FCLC"
+    SUFFIX = ".fclc"
+
+    def __init__(self, directory: str, max_bytes: int = 64 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def default_directory(file_path: str) -> str:
+        """__fclcache__ next to the source file, like __pycache__"""
+        return os.path.join(os.path.dirname(os.path.abspath(file_path)), "__fclcache__")
+
+    def key(self, code: str, passes=()) -> str:
+        digest = hashlib.sha256()
+        digest.update(__version__.encode())
+        digest.update(b"\0" + ",".join(passes).encode() + b"\0")
+        digest.update(code.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def prefix(self, file_path: str, passes=()) -> str:
+        """
+        Start of the names of the entries of `file_path` run with `passes`,
+        files with the same name in other directories get other ones
+        """
+        path_hash = hashlib.sha256(os.path.abspath(file_path).encode("utf-8", "surrogatepass"))
+        path_hash.update(b"\0" + ",".join(passes).encode())
+        return f"{os.path.basename(file_path)}.{path_hash.hexdigest()[:8]}."
+
+    def path(self, file_path: str, key: str, passes=()) -> str:
+        return os.path.join(self.directory, f"{self.prefix(file_path, passes)}{key[:32]}{self.SUFFIX}")
+
+    def load(self, file_path: str, code: str, passes=()) -> Program | None:
+        """The cached ast of `code` or None on a miss"""
+        path = self.path(file_path, self.key(code, passes), passes)
+        try:
+            with open(path, "rb") as f:
+                header = f.readline()
+                if header != self.header():
+                    return None
+                # unpickling allocates every node at once, the garbage collector
+                # would keep scanning them and take longer than the load itself
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    ast = pickle.load(f)
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # truncated or written by something else, it gets replaced on the next store
+            self.remove(path)
+            return None
+
+        if not isinstance(ast, Program):
+            return None
+        # the tokens share one Source, it still has the path the entry was stored
+        # from, which can be another path to the same file
+        ast.tok.source.file_path = file_path
+
+        # the modification time is the last use for the eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return ast
+
+    def store(self, file_path: str, code: str, ast: Program, passes=()) -> bool:
+        """Cache `ast` as the parsed `code`, returns False if it couldn't be written"""
+        path = self.path(file_path, self.key(code, passes), passes)
+        try:
+            data = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError):
+            return False
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write to a temporary file first so other processes never read half an entry
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self.header())
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return False
+
+        self.invalidate(file_path, passes, keep=path)
+        self.evict()
+        # an entry bigger than the whole cache is evicted right away
+        return os.path.exists(path)
+
+    def header(self) -> bytes:
+        return self.MAGIC + b" " + __version__.encode() + b"\n"
+
+    def entries(self) -> list[os.DirEntry]:
+        try:
+            return [entry for entry in os.scandir(self.directory) if entry.name.endswith(self.SUFFIX)]
+        except OSError:
+            return []
+
+    def invalidate(self, file_path: str, passes=(), keep: str = None):
+        """Remove the entries of `file_path` run with `passes`, except `keep`"""
+        prefix = self.prefix(file_path, passes)
+        for entry in self.entries():
+            if entry.name.startswith(prefix) and entry.path != keep:
+                self.remove(entry.path)
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in self.entries():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def clear(self):
+        for entry in self.entries():
+            self.remove(entry.path)
+
+    def remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
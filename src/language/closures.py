@@ -0,0 +1,379 @@
+from .builtins import *
+from .interpreter import Interpreter
+from .pparser import *
+from .resolver import *
+
+
+class ClosureInterpreter(Interpreter):
+    """
+    Compiles the ast into a tree of python closures once and then runs them,
+    so node types and function names are only dispatched at compile time.
+    Anything unusual (wrong arity, bad arguments...) falls back to the tree walker
+    so the output and the error messages stay the same.
+    """
+
+    def __init__(self, ast: Program, builtins: BuiltinRegistry = None, output=None):
+        super().__init__(ast, builtins, output)
+        self.code = None
+
+    def run(self):
+        if self.code is None:
+            self.bind(self.ast)
+            self.code = [self.compile_statement(stat) for stat in self.ast.statements]
+
+        last_return = None
+        try:
+            for stat in self.code:
+                last_return = stat()
+        finally:
+            self.output.flush()
+
+        return last_return
+
+    def prepare(self, stat: Node):
+        return self.compile_statement(stat)
+
+    def compile_statement(self, stat: Node):
+        # the closures call each other as deep as the code is nested, the tree walker doesn't recurse
+        if nesting_depth(stat) > self.max_depth:
+            return lambda: self.evaluate(stat)
+        return self.compile(stat)
+
+    def compile(self, node):
+        if isinstance(node, Program):
+            return self.compile_program(node)
+        elif isinstance(node, BlockNode):
+            return self.compile_block(node)
+        elif isinstance(node, (ConstNode, StringNode)):
+            value = node.value
+            return lambda: value
+        elif isinstance(node, NumberNode):
+            return self.compile_number(node)
+        elif isinstance(node, ListNode):
+            return self.compile_list(node)
+        elif isinstance(node, AssignmentNode):
+            return self.compile_assignment(node)
+        elif isinstance(node, BoolNode):
+            value = node.value
+            return lambda: value
+        elif isinstance(node, VarAccessNode):
+            return self.compile_var_access(node)
+        elif isinstance(node, FunctionCallNode):
+            return self.compile_function_call(node)
+
+        return lambda: self.evaluate(node)
+
+    def compile_program(self, node: Program):
+        statements = [self.compile(stat) for stat in node.statements]
+
+        def program():
+            for stat in statements:
+                stat()
+
+        return program
+
+    def compile_block(self, node: BlockNode):
+        exprs = [self.compile(expr) for expr in node.statements]
+
+        if len(exprs) == 0:
+            return lambda: None
+        elif len(exprs) == 1:
+            return exprs[0]
+
+        def block():
+            for expr in exprs:
+                last_expr = expr()
+            return last_expr
+
+        return block
+
+    def compile_number(self, node: NumberNode):
+        try:
+            value = float(node.value) if "." in node.value else int(node.value)
+        except ValueError:
+            # let it fail at runtime like the tree walker does
+            return lambda: self.evaluate(node)
+        return lambda: value
+
+    def compile_list(self, node: ListNode):
+        values = [self.compile(value) for value in node.values]
+        make_list = self.make_list
+
+        def list_value():
+            if node.constant is not None:
+                return node.constant
+            return make_list(node, [value() for value in values])
+
+        return list_value
+
+    def compile_assignment(self, node: AssignmentNode):
+        expr = self.compile(node.expr)
+        slot = self.slot(node)
+        frame = self.frame
+
+        def assignment():
+            v_val = expr()
+            frame[slot] = v_val
+            return v_val
+
+        return assignment
+
+    def compile_var_access(self, node: VarAccessNode):
+        slot = self.slot(node)
+        frame = self.frame
+
+        def var_access():
+            value = frame[slot]
+            if value is UNSET:
+                self.eprint(f"Variable '{node.var_name}' does not exists: {node.tok}", node.tok)
+            return self.force(value) if type(value) is Thunk else value
+
+        return var_access
+
+    def compile_function_call(self, node: FunctionCallNode):
+        builtin = self.builtins.get(node.func_name)
+        if builtin is None or not builtin.accepts(len(node.args)):
+            # reports the missing function or the wrong number of arguments
+            return lambda: self.evaluate(node)
+
+        func = builtin.func
+
+        # syntax level functions
+        if not builtin.strict:
+            if func is builtin_for:
+                return self.compile_for(node)
+            elif func is builtin_foreach:
+                return self.compile_foreach(node)
+            elif func is builtin_var:
+                return self.compile_var(node)
+            elif func is builtin_if:
+                return self.compile_if(node)
+            elif func is builtin_logical:
+                return self.compile_logical(node.func_name, [self.compile(arg) for arg in node.args], node)
+
+            arg_nodes = node.args
+            return lambda: func(self, arg_nodes, node)
+
+        args = [self.compile(arg) for arg in node.args]
+
+        # normal functions
+        if func is builtin_log:
+            return self.compile_log(args, node)
+        elif func is builtin_arithmetic:
+            return self.compile_arithmetic_op(node.func_name, args, node)
+        elif func is builtin_conditional and node.func_name in ("eq", "neq"):
+            return self.compile_equality(node.func_name, args, node)
+        elif func is builtin_conditional:
+            return self.compile_comparison(node.func_name, args, node)
+
+        def function_call():
+            return func(self, [arg() for arg in args], node)
+
+        return function_call
+
+    def compile_log(self, args: list, node: FunctionCallNode):
+        output = self.output
+
+        def log():
+            values = [arg() for arg in args]
+            try:
+                values = [format_value(value) for value in values]
+            except ValueError:
+                self.digits_error(node)
+            output.write(" ".join(values) + "\n")
+
+        return log
+
+    def compile_arithmetic_op(self, func_name, args: list, node: FunctionCallNode):
+        op = ARITH_OPS[func_name]
+        arg1, arg2 = args
+        numbers = (int, float)
+        divides = func_name in DIVISIONS
+
+        def arithmetic_op():
+            val1 = arg1()
+            val2 = arg2()
+            if type(val1) in numbers and type(val2) in numbers and not (divides and val2 == 0):
+                try:
+                    return op(val1, val2)
+                except ArithmeticError:
+                    pass
+            # strings, division by zero, overflows and type errors are handled by the tree walker
+            return self.run_arithmetic_op(func_name, [val1, val2], node)
+
+        return arithmetic_op
+
+    def compile_equality(self, func_name, args: list, node: FunctionCallNode):
+        arg1, arg2 = args
+        is_eq = func_name == "eq"
+
+        def equality():
+            val1 = arg1()
+            val2 = arg2()
+            if type(val1) is ListValue or type(val2) is ListValue:
+                return self.run_conditionals(func_name, [val1, val2], node)
+            return equal(val1, val2) is is_eq
+
+        return equality
+
+    def compile_comparison(self, func_name, args: list, node: FunctionCallNode):
+        op = COMPARE_OPS[func_name]
+        arg1, arg2 = args
+
+        def comparison():
+            val1 = arg1()
+            val2 = arg2()
+            if type(val1) is int and type(val2) is int:
+                return op(val1, val2)
+            return self.run_conditionals(func_name, [val1, val2], node)
+
+        return comparison
+
+    def compile_logical(self, func_name, args: list, node: FunctionCallNode):
+        # 'and' stops at the first false argument and 'or' at the first true one
+        stop = func_name == "or"
+
+        if len(args) == 2:
+            arg1, arg2 = args
+
+            def logical():
+                if bool(arg1()) is stop:
+                    return stop
+                return bool(arg2())
+
+            return logical
+
+        def logical():
+            for arg in args:
+                if bool(arg()) is stop:
+                    return stop
+            return not stop
+
+        return logical
+
+    def compile_for(self, node: FunctionCallNode):
+        args = node.args
+        if not isinstance(args[0], VarAccessNode):
+            return lambda: self.run_for(args, node)
+
+        start = self.compile(args[1])
+        end = self.compile(args[2])
+        exprs = [self.compile(expr) for expr in args[3:]]
+        slot = self.slot(args[0])
+        frame = self.frame
+
+        def for_loop():
+            start_range = start()
+            end_range = end()
+
+            if type(start_range) is not int:
+                self.eprint(f"'for' function takes an integer as it's second argument, {node.tok}", node.tok)
+
+            if type(end_range) is not int:
+                self.eprint(f"'for' function takes an integer as it's third argument, {node.tok}", node.tok)
+
+            if len(exprs) == 1:
+                expr = exprs[0]
+                for i in range(start_range, end_range):
+                    frame[slot] = i
+                    expr()
+            else:
+                for i in range(start_range, end_range):
+                    frame[slot] = i
+                    for expr in exprs:
+                        expr()
+
+            frame[slot] = UNSET
+
+        return for_loop
+
+    def compile_foreach(self, node: FunctionCallNode):
+        args = node.args
+        if not isinstance(args[0], VarAccessNode):
+            return lambda: self.run_foreach(args, node)
+
+        source = args[1]
+        if is_range_call(source, self.builtins):
+            range_args = [self.compile(arg) for arg in source.args]
+            values = lambda: iter(range(*range_bounds(self, [arg() for arg in range_args], source)))
+        else:
+            source_value = self.compile(source)
+            values = lambda: self.iterable(source_value(), node)
+
+        exprs = [self.compile(expr) for expr in args[2:]]
+        slot = self.slot(args[0])
+        frame = self.frame
+
+        def foreach_loop():
+            if len(exprs) == 1:
+                expr = exprs[0]
+                for value in values():
+                    frame[slot] = value
+                    expr()
+            else:
+                for value in values():
+                    frame[slot] = value
+                    for expr in exprs:
+                        expr()
+
+            frame[slot] = UNSET
+
+        return foreach_loop
+
+    def compile_var(self, node: FunctionCallNode):
+        args = node.args
+        if not isinstance(args[0], VarAccessNode):
+            return lambda: self.run_var(args, node)
+
+        slot = self.slot(args[0])
+        v_value = args[1]
+        make_thunk = self.make_thunk
+        frame = self.frame
+
+        def var():
+            thunk = frame[slot] = make_thunk(v_value)
+            return thunk
+
+        return var
+
+    def compile_if(self, node: FunctionCallNode):
+        args = node.args
+        condition = self.compile(args[0])
+        then_expr = self.compile(args[1])
+        else_clauses = self.compile_else_clauses(args[2:])
+
+        def if_expr():
+            if condition():
+                return then_expr()
+
+            for cond, expr in else_clauses:
+                if cond is None:
+                    return expr()
+
+                if cond():
+                    return expr()
+
+        return if_expr
+
+    def compile_else_clauses(self, args: list[Node]):
+        """
+        Compiles the elif and else clauses of an if into (cond, expr) pairs,
+        cond is None for the else expression
+        """
+        # elif arguments are checked before any of the conditions are evaluated
+        for clause in args:
+            if isinstance(clause, FunctionCallNode) and clause.func_name == "elif" and len(clause.args) != 2:
+                error = lambda clause=clause: self.arg_error("elif", len(clause.args), 2, clause.tok)
+                return [(None, error)]
+
+        clauses = []
+        for clause in args:
+            if isinstance(clause, FunctionCallNode) and clause.func_name == "elif":
+                clauses.append((self.compile(clause.args[0]), self.compile(clause.args[1])))
+            elif clause is args[-1]:
+                clauses.append((None, self.compile(clause)))
+            else:
+                clauses.append((None, lambda clause=clause: self.eprint(f"Invalid Syntax in {clause.tok}", clause.tok)))
+                break
+
+        return clauses
@@ -0,0 +1,26 @@
+class FclError(Exception):
+    """
+    Error in an FCL program, `message` is what main.py prints before exiting with 1.
+    `tok` is the token the error is about and `loc` its location, when there is one.
+    """
+
+    def __init__(self, message: str, tok=None, loc=None):
+        super().__init__(message)
+        self.message = message
+        self.tok = tok
+        self.loc = tok.start_loc if loc is None and tok is not None else loc
+
+    def __reduce__(self):
+        return type(self), (self.message, self.tok, self.loc)
+
+
+class LexError(FclError):
+    """Source that can't be split into tokens"""
+
+
+class ParseError(FclError):
+    """Tokens that don't form a program"""
+
+
+class FclRuntimeError(FclError):
+    """Error while running a program, raised by Interpreter.eprint"""
@@ -0,0 +1,116 @@
+import operator
+
+from .builtins import ARITH_OPS, COMPARE_OPS
+from .pparser import *
+from .values import ListValue, Rope, concat
+
+NUMBERS = (int, float)
+# types 'eq' compares like python does, bools are only equal to bools
+SCALARS = (int, float, str)
+STRINGS = (str, Rope)
+
+
+class InlineCache:
+    """
+    Operand types seen by one arithmetic or comparison call site.
+    While the operands have the types `type1` and `type2`, `op` is called on them
+    without checking them again, `nonzero` sites ('div', 'mod') also need a second operand
+    that isn't zero. Operands failing the guard go through the generic path, which
+    specializes the site on their types (a deopt when it already was specialized).
+    Sites deoptimized `max_deopts` times stay on the generic path.
+    """
+    __slots__ = ("type1", "type2", "op", "nonzero", "hits", "misses", "deopts")
+
+    max_deopts = 4
+
+    def __init__(self):
+        self.type1 = None
+        self.type2 = None
+        self.op = None
+        self.nonzero = False
+        self.hits = 0
+        self.misses = 0
+        self.deopts = 0
+
+    @property
+    def megamorphic(self) -> bool:
+        return self.deopts >= self.max_deopts
+
+    def update(self, type1: type, type2: type, op, nonzero: bool = False):
+        """Record a miss and specialize on `type1` and `type2`, `op` is None when they have no fast path"""
+        self.misses += 1
+        if self.op is not None:
+            self.deopts += 1
+
+        if op is None or self.megamorphic:
+            self.type1 = self.type2 = self.op = None
+            return
+
+        self.type1 = type1
+        self.type2 = type2
+        self.op = op
+        self.nonzero = nonzero
+
+    def __repr__(self):
+        types = f"{self.type1.__name__}, {self.type2.__name__}" if self.op is not None else "generic"
+        return f"InlineCache({types}, hits={self.hits}, misses={self.misses}, deopts={self.deopts})"
+
+
+class ColdCache(InlineCache):
+    """Cache of the call sites that ran once, they get their own one on the second call"""
+    __slots__ = ()
+
+    def __reduce__(self):
+        # unpickles as the COLD of this module, sites are checked with `is COLD`
+        return "COLD"
+
+COLD = ColdCache()
+
+
+def arithmetic_op(func_name: str, type1: type, type2: type):
+    """Fast path of an arithmetic function for operands of these types, None if there isn't one"""
+    if type1 in NUMBERS and type2 in NUMBERS:
+        return ARITH_OPS[func_name]
+    if func_name == "add" and type1 in STRINGS and type2 in STRINGS:
+        return concat
+    return None
+
+
+def comparison_op(func_name: str, type1: type, type2: type):
+    """Fast path of a comparison function for operands of these types, None if there isn't one"""
+    if func_name in ("eq", "neq"):
+        if type1 is ListValue or type2 is ListValue:
+            return None
+        if type1 is type2 or (type1 in SCALARS and type2 in SCALARS):
+            return operator.eq if func_name == "eq" else operator.ne
+        return None
+    if type1 is int and type2 is int:
+        return COMPARE_OPS[func_name]
+    return None
+
+
+def cache_stats(node: Node) -> dict:
+    """Counters of the inline caches of the call sites under `node`"""
+    stats = {"sites": 0, "hits": 0, "misses": 0, "deopts": 0, "megamorphic": 0}
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, (Program, BlockNode)):
+            stack.extend(current.statements)
+        elif isinstance(current, FunctionCallNode):
+            stack.extend(current.args)
+            cache = current.cache
+            if cache is not None and cache is not COLD:
+                stats["sites"] += 1
+                stats["hits"] += cache.hits
+                stats["misses"] += cache.misses
+                stats["deopts"] += cache.deopts
+                stats["megamorphic"] += cache.megamorphic
+        elif isinstance(current, ListNode):
+            stack.extend(current.values)
+        elif isinstance(current, AssignmentNode):
+            stack.append(current.expr)
+        elif isinstance(current, ElifNode):
+            stack.append(current.cond)
+            stack.append(current.expr)
+    return stats
@@ -1,39 +1,124 @@
+from array import array
+import contextlib
+import pickle
+from itertools import repeat
+
+from .builtins import *
+from .errors import *
+from .inline_cache import *
+from .output import *
+from .parallel import *
 from .pparser import *
+from .resolver import *
+from .values import *
 
 class Interpreter:
+    # processes running 'pfor' loops, None for one per cpu
+    pfor_workers = None
+    # nested calls, blocks, lists and assignments evaluated by recursion, deeper ones use evaluate_iterative
+    max_depth = 100
 
-    def __init__(self, ast: Program):
-        self.variables = {}
+    def __init__(self, ast: Program, builtins: BuiltinRegistry = None, output=None):
         self.ast = ast
+        self.builtins = BUILTINS if builtins is None else builtins
+        # where 'log' writes, see BufferedSink
+        self.output = BufferedSink() if output is None else output
+        # variable values by slot, see Resolver
+        self.resolver = Resolver()
+        self.frame = []
+        # slots read by the expressions of 'var' calls, see Thunk
+        self.var_slots: dict[Node, tuple[int, ...]] = {}
+        # nesting of the nodes being evaluated, see max_depth
+        self.depth = 0
+
+    @property
+    def variables(self) -> dict:
+        """Currently defined variables by name"""
+        return {name: self.frame[slot] for name, slot in self.resolver.slots.items() if self.frame[slot] is not UNSET}
+
+    def inline_cache_stats(self) -> dict:
+        """Hits, misses and deopts of the arithmetic and comparison call sites of the program"""
+        return cache_stats(self.ast)
+
+    def bind(self, node: Node):
+        """Assign frame slots to the identifiers under `node`"""
+        self.resolver.resolve(node)
+        self.frame.extend([UNSET] * (len(self.resolver.names) - len(self.frame)))
+
+    def slot(self, node) -> int:
+        if node.slot is None:
+            self.bind(node)
+        return node.slot
 
     def run(self):
+        self.bind(self.ast)
         last_return = None
-        for stat in self.ast.statements:
-            last_return = self.evaluate(stat)
+        try:
+            for stat in self.ast.statements:
+                last_return = self.evaluate(stat)
+        finally:
+            self.output.flush()
 
         return last_return
 
-    def eprint(self, msg: str):
-        print(msg)
-        exit(1)
+    def run_stream(self, statements):
+        """
+        Run top level statements one at a time as they are produced (see Parser.statements),
+        none of them are kept after running
+        """
+        last_return = None
+        try:
+            for stat in statements:
+                self.bind(stat)
+                last_return = self.run_statement(stat)
+                # thunks keep their slots, the cache would keep every statement alive
+                self.var_slots.clear()
+        finally:
+            self.output.flush()
+
+        return last_return
+
+    def run_statement(self, stat: Node):
+        return self.prepare(stat)()
+
+    def prepare(self, stat: Node):
+        """A function running `stat` that can be called any number of times"""
+        return lambda: self.evaluate(stat)
+
+    def eprint(self, msg: str, tok: Token = None):
+        """Stop the program with an error, main.py prints `msg` and exits with 1"""
+        raise FclRuntimeError(msg, tok)
+
+    def digits_error(self, node: Node):
+        """Stop on an int with more digits than python converts to a string"""
+        self.eprint(f"number has too many digits to convert to a string, {node.tok}", node.tok)
 
     def arg_error(self, func_name, arg_len, expected_len, tok, exact=True):
         if exact:
             if arg_len != expected_len:
-                self.eprint(f"'{func_name}' function takes exactly {expected_len} arguments, {arg_len} were given.\n{tok}")
+                self.eprint(f"'{func_name}' function takes exactly {expected_len} arguments, {arg_len} were given.\n{tok}", tok)
         else:
             if arg_len < expected_len:
-                self.eprint(f"'{func_name}' function takes atleast {expected_len} arguments, {arg_len} were given.\n{tok}")
+                self.eprint(f"'{func_name}' function takes atleast {expected_len} arguments, {arg_len} were given.\n{tok}", tok)
 
     def evaluate(self, node):
         if isinstance(node, Program):
             for statement in node.statements:
                 self.evaluate(statement)
         elif isinstance(node, BlockNode):
-            last_expr = NoneNode(node.tok)
-            for expr in node.statements:
-                last_expr = self.evaluate(expr)
-            return last_expr
+            depth = self.depth
+            if depth > self.max_depth:
+                return self.evaluate_iterative(node)
+            self.depth = depth + 1
+            try:
+                last_expr = None
+                for expr in node.statements:
+                    last_expr = self.evaluate(expr)
+                return last_expr
+            finally:
+                self.depth = depth
+        elif isinstance(node, ConstNode):
+            return node.value
         elif isinstance(node, StringNode):
             return node.value
         elif isinstance(node, NumberNode):
@@ -42,214 +127,518 @@ class Interpreter:
             else:
                 return int(node.value)
         elif isinstance(node, ListNode):
-            return node.values
+            if node.constant is not None:
+                return node.constant
+            depth = self.depth
+            if depth > self.max_depth:
+                return self.evaluate_iterative(node)
+            self.depth = depth + 1
+            try:
+                return self.make_list(node, [self.evaluate(value) for value in node.values])
+            finally:
+                self.depth = depth
         elif isinstance(node, AssignmentNode):
-            v_val = self.evaluate(node.expr)
-            self.variables[node.var_name] = v_val
-            return v_val
+            depth = self.depth
+            if depth > self.max_depth:
+                return self.evaluate_iterative(node)
+            self.depth = depth + 1
+            try:
+                v_val = self.evaluate(node.expr)
+                self.frame[self.slot(node)] = v_val
+                return v_val
+            finally:
+                self.depth = depth
         elif isinstance(node, BoolNode):
-            return node
+            return node.value
         elif isinstance(node, VarAccessNode):
-            var_name = node.var_name
-            value = self.variables.get(var_name)
-            if value:
-                return self.evaluate(value) if isinstance(value, Node) else value
-            else:
-                self.eprint(f"Variable '{var_name}' does not exists: {node.tok}")
+            slot = node.slot
+            value = self.frame[slot if slot is not None else self.slot(node)]
+            if value is UNSET:
+                self.eprint(f"Variable '{node.var_name}' does not exists: {node.tok}", node.tok)
+            return self.force(value) if type(value) is Thunk else value
         elif isinstance(node, FunctionCallNode):
-            func_name = node.func_name
-
-            # TODO: Fix clutterness and add more functions
-            # syntax level functions
-            if func_name == "for":
-                # syntax for(var name: Identifier, till: integer, *expressions)
-                return self.run_for(node.args, node)
-            elif func_name == "var":
-                # syntax var(name: Identifier, value: any)
-                return self.run_var(node.args, node)
-            elif func_name == "if":
-                return self.run_if(node.args, node)
-            elif func_name == "elif":
-                self.arg_error(func_name, len(node.args), 2, node.tok)
-                return ElifNode(node.args[0], node.args[1], node.tok)
-
-            # evaluate args for normal functions
-            args = [self.evaluate(arg) if isinstance(arg, Node) else arg for arg in node.args]
-            # normal functions
-            if func_name == "log":
-                values = [str(value) for value in args]
-                print(" ".join(values))
-                return NoneNode(node.tok)
-            elif func_name in ("add", "sub", "mul", "div", "pow", "mod"):
-                return self.run_arithmetic_op(func_name, args, node)
-            elif func_name == "str":
-                self.arg_error(func_name, len(args), 1, node.tok)
-                return str(args[0])
-            elif func_name == "index":
-                # index lists and str
-                self.arg_error(func_name, len(args), 2, node.tok)
-
-                if not isinstance(args[0], (list, str)):
-                    self.eprint(f"'index' function only accepts string or list as it's first argument.\n{node.tok}")
-                
-                if not isinstance(args[1], int):
-                    self.eprint(f"'index' function only accepts integer as it's first argument.\n{node.tok}")
-
-                indx = args[1]
-                if indx > len(args[0]):
-                    self.eprint(f"index out of bounds.\n{node.tok}")
-
-                value = args[0][indx]
-                return self.evaluate(value) if isinstance(value, Node) else value
-
-            elif func_name == "len":
-                self.arg_error(func_name, len(args), 1, node.tok)
-                if not isinstance(args[0], (str, list)):
-                    self.eprint(f"'len' function only takes string or list as it's first argument.\n{node.tok}")
-                return len(args[0])
-            elif func_name == "input":
-                self.arg_error(func_name, len(args), 1, node.tok)
-
-                if not isinstance(args[0], str):
-                    self.eprint(f"'input' function takes string as an argument\n{node.tok}")
-
-                ret_val = input(args[0])
-                return StringNode(ret_val, node.tok)
-            elif func_name in ("eq", "neq", "gt", "gte", "lt", "lte"):
-                return self.run_conditionals(func_name, args, node)
-            elif func_name in ("and", "or"):
-                self.arg_error(func_name, len(node.args), 2, node.tok)
-                arg1 = args[0]
-                arg2 = args[1]
-                if isinstance(arg1, BoolNode):
-                    arg1 = arg1.is_true()
-                if isinstance(arg2, BoolNode):
-                    arg2 = arg2.is_true()
-
-                if func_name == "and":
-                    res = arg1 and arg2
+            builtin = node.builtin
+            if builtin is None or node.registry is not self.builtins:
+                builtin = self.resolve(node)
+
+            depth = self.depth
+            if depth > self.max_depth:
+                return self.evaluate_iterative(node)
+            self.depth = depth + 1
+            try:
+                if builtin.strict:
+                    # evaluate args for normal functions
+                    return builtin.func(self, [self.evaluate(arg) for arg in node.args], node)
+                return builtin.func(self, node.args, node)
+            finally:
+                self.depth = depth
+        else:
+            self.eprint(f"Node not implimented {type(node)}:{node.tok}", node.tok)
+
+    def evaluate_iterative(self, node):
+        """
+        Evaluate `node` like evaluate does but with explicit stacks instead of python recursion,
+        used for code nested deeper than max_depth. 'if', 'and' and 'or' are evaluated on
+        the stacks too, other syntax level functions ('for', 'var'...) get their argument
+        nodes and evaluate them with evaluate. Code still nested too deeply for python
+        stops with an error at the node where it went past max_depth.
+        """
+        depth = self.depth
+        # only the outermost one reports errors, the ones it runs see a deeper depth
+        outermost = depth == self.max_depth + 1
+        self.depth = depth + 1
+        try:
+            values = []
+            # nodes to evaluate paired with None, True once their children's values are on `values`
+            # or the index of the argument of an 'if', 'and' or 'or' whose value is on `values`
+            stack = [(node, None)]
+            while stack:
+                current, state = stack.pop()
+                if state is True:
+                    if isinstance(current, AssignmentNode):
+                        self.frame[self.slot(current)] = values[-1]
+                        continue
+
+                    children = current.args if isinstance(current, FunctionCallNode) else \
+                        current.values if isinstance(current, ListNode) else current.statements
+                    args = values[len(values) - len(children):]
+                    del values[len(values) - len(children):]
+                    if isinstance(current, FunctionCallNode):
+                        values.append(current.builtin.func(self, args, current))
+                    elif isinstance(current, ListNode):
+                        values.append(self.make_list(current, args))
+                    else:
+                        values.append(args[-1] if args else None)
+                elif state is not None:
+                    step = self.if_step if current.builtin.func is builtin_if else self.logical_step
+                    step(current, state, values.pop(), stack, values)
+                elif isinstance(current, FunctionCallNode):
+                    builtin = current.builtin
+                    if builtin is None or current.registry is not self.builtins:
+                        builtin = self.resolve(current)
+                    if builtin.func is builtin_if or builtin.func is builtin_logical:
+                        stack.append((current, 0))
+                        stack.append((current.args[0], None))
+                    elif not builtin.strict:
+                        values.append(builtin.func(self, current.args, current))
+                    else:
+                        stack.append((current, True))
+                        stack.extend((arg, None) for arg in reversed(current.args))
+                elif isinstance(current, BlockNode):
+                    stack.append((current, True))
+                    stack.extend((stat, None) for stat in reversed(current.statements))
+                elif isinstance(current, ListNode) and current.constant is None:
+                    stack.append((current, True))
+                    stack.extend((value, None) for value in reversed(current.values))
+                elif isinstance(current, AssignmentNode):
+                    stack.append((current, True))
+                    stack.append((current.expr, None))
                 else:
-                    res = arg1 or arg2
-                return BoolNode("true" if res else "false", node.tok)
-            else:
-                self.eprint(f"function '{func_name}' does not exist at {node.tok}")
+                    values.append(self.evaluate(current))
+            return values[-1]
+        except RecursionError:
+            if not outermost:
+                raise
+            self.eprint(f"Code nested too deeply: {node.tok}", node.tok)
+        finally:
+            self.depth = depth
+
+    def if_step(self, node: FunctionCallNode, index: int, condition, stack: list, values: list):
+        """
+        Continue an 'if' in evaluate_iterative after the condition of its argument `index`,
+        pushes the expression to evaluate or the next condition
+        """
+        args = node.args
+        if condition:
+            stack.append((args[1] if index == 0 else args[index].args[1], None))
+            return
+        if index == 0:
+            # elif arguments are checked before any of the conditions are evaluated
+            for clause in args[2:]:
+                if self.is_elif(clause) and len(clause.args) != 2:
+                    self.arg_error("elif", len(clause.args), 2, clause.tok)
+
+        index = index + 1 if index else 2
+        if index == len(args):
+            values.append(None)
+            return
+        clause = args[index]
+        if self.is_elif(clause):
+            stack.append((node, index))
+            stack.append((clause.args[0], None))
+        elif index == len(args) - 1:
+            stack.append((clause, None))
         else:
-            self.eprint(f"Node not implimented {type(node)}:{node.tok}")
+            self.eprint(f"Invalid Syntax in {clause.tok}", clause.tok)
+
+    def logical_step(self, node: FunctionCallNode, index: int, value, stack: list, values: list):
+        """Continue an 'and' or an 'or' in evaluate_iterative after its argument `index`"""
+        is_and = node.func_name == "and"
+        if not value if is_and else value:
+            values.append(not is_and)
+        elif index + 1 == len(node.args):
+            values.append(is_and)
+        else:
+            stack.append((node, index + 1))
+            stack.append((node.args[index + 1], None))
+
+    def make_list(self, node: ListNode, values: list) -> ListValue:
+        """ListValue of `node` from its evaluated elements, lists of literals are only created once"""
+        if node.constant is not None:
+            return node.constant
+        value = ListValue.from_values(values, list_texts(node.values))
+        if all(is_literal(element) for element in node.values):
+            node.constant = value
+        return value
+
+    def resolve(self, node: FunctionCallNode) -> Builtin:
+        """
+        Look up the builtin called by `node` and bind it to the node if the arguments fit,
+        an ast run by interpreters with other registries gets resolved again
+        """
+        builtin = self.builtins.get(node.func_name)
+
+        if builtin is None or not builtin.accepts(len(node.args)):
+            if builtin is None or builtin.strict:
+                args = [self.evaluate(arg) for arg in node.args]
+            else:
+                args = node.args
+            # reports the missing function or the wrong number of arguments
+            self.call_function(node.func_name, args, node)
 
-    def run_if(self, args: list[Node], clause):
-        self.arg_error("if", len(args), 2, clause.tok, exact=False)
+        node.builtin = builtin
+        node.registry = self.builtins
+        return builtin
 
-        condition = self.evaluate(args[0])
-        then_expr = args[1]
+    def call_function(self, func_name, args: list, node: FunctionCallNode):
+        """Call a builtin by name with already evaluated args (or argument nodes for syntax level functions)"""
+        builtin = self.builtins.get(func_name)
+        if builtin is None:
+            self.eprint(f"function '{func_name}' does not exist at {node.tok}", node.tok)
 
-        args = args[2:]
+        if builtin.arity is not None:
+            self.arg_error(func_name, len(args), builtin.arity, node.tok, builtin.exact)
+        return builtin.func(self, args, node)
+
+    def run_if(self, args: list[Node], node):
+        condition = self.evaluate(args[0])
 
         # typical one conditon one expr if-statement
-        if condition.is_true():
-            return self.evaluate(then_expr)
-        
-        args = [self.evaluate(expr) if isinstance(expr, FunctionCallNode) and expr.func_name == "elif" else expr for expr in args]
-        
-        from pprint import pprint
-        
-        for clause in args:
-            if isinstance(clause, ElifNode):
-                cond = self.evaluate(clause.cond)
-                if isinstance(cond, BoolNode):
-                    if cond.is_true():
-                        return self.evaluate(clause.expr)
-                elif cond:
-                    return self.evaluate(clause.expr)
-            elif clause == args[-1]:
+        if condition:
+            return self.evaluate(args[1])
+
+        clauses = args[2:]
+        # elif arguments are checked before any of the conditions are evaluated
+        for clause in clauses:
+            if self.is_elif(clause) and len(clause.args) != 2:
+                self.arg_error("elif", len(clause.args), 2, clause.tok)
+
+        # conditions are evaluated in order, only until one of them is true
+        for clause in clauses:
+            if self.is_elif(clause):
+                cond = self.evaluate(clause.args[0])
+                if cond:
+                    return self.evaluate(clause.args[1])
+            elif clause is clauses[-1]:
                 return self.evaluate(clause)
             else:
-                self.eprint(f"Invalid Syntax in {clause.tok}")
+                self.eprint(f"Invalid Syntax in {clause.tok}", clause.tok)
+
+    def is_elif(self, node: Node) -> bool:
+        return isinstance(node, FunctionCallNode) and node.func_name == "elif"
+
+    def run_logical(self, func_name, args: list, node):
+        """
+        'and' and 'or' of any number of arguments, evaluated in order
+        only until the result is known
+        """
+        is_and = func_name == "and"
+        for arg in args:
+            value = self.evaluate(arg) if isinstance(arg, Node) else arg
+            if not value if is_and else value:
+                return not is_and
+        return is_and
 
     def run_for(self, args: list, node: FunctionCallNode):
-        self.arg_error("for", len(args), 3, node.tok, exact=False)
-
         if not isinstance(args[0], VarAccessNode):
-            self.eprint(f"'for' function takes an identifier as it's first argument, {node.tok}")
+            self.eprint(f"'for' function takes an identifier as it's first argument, {node.tok}", node.tok)
 
         start_range = self.evaluate(args[1]) if isinstance(args[1], Node) else args[1]
         end_range = self.evaluate(args[2]) if isinstance(args[2], Node) else args[2]
 
-        if not isinstance(start_range, int):
-            self.eprint(f"'for' function takes an integer as it's second argument, {node.tok}")
+        if type(start_range) is not int:
+            self.eprint(f"'for' function takes an integer as it's second argument, {node.tok}", node.tok)
         
-        if not isinstance(end_range, int):
-            self.eprint(f"'for' function takes an integer as it's third argument, {node.tok}")
+        if type(end_range) is not int:
+            self.eprint(f"'for' function takes an integer as it's third argument, {node.tok}", node.tok)
 
-        identifier = args[0].var_name
+        slot = self.slot(args[0])
         expressions = args[3:]
-        
-        for i in range(start_range, end_range):
-            self.variables[identifier] = NumberNode(str(i), node.tok)
+        frame = self.frame
+
+        # the counter is kept as a plain int
+        for i in self.for_range(start_range, end_range):
+            frame[slot] = i
             for expression in expressions:
                 self.evaluate(expression) 
 
-        del self.variables[identifier]
+        frame[slot] = UNSET
 
-    def run_var(self, args: list[Node], node):
-        self.arg_error("var", len(args), 2, node.tok)
+    def run_foreach(self, args: list, node: FunctionCallNode):
+        if not isinstance(args[0], VarAccessNode):
+            self.eprint(f"'foreach' function takes an identifier as it's first argument, {node.tok}", node.tok)
+
+        values = self.iterate(args[1], node)
+        slot = self.slot(args[0])
+        expressions = args[2:]
+        frame = self.frame
+
+        for value in self.for_values(values):
+            frame[slot] = value
+            for expression in expressions:
+                self.evaluate(expression)
+
+        frame[slot] = UNSET
+
+    def iterate(self, source: Node, node: FunctionCallNode):
+        """Iterator over the values of a 'foreach' loop, a range(...) call is iterated without creating its list"""
+        if is_range_call(source, self.builtins):
+            return iter(range(*range_bounds(self, [self.evaluate(arg) for arg in source.args], source)))
+        return self.iterable(self.evaluate(source), node)
+
+    def iterable(self, values, node: FunctionCallNode):
+        """Iterator over the elements of a list, the characters of a string or the values of a Sequence"""
+        if not isinstance(values, (ListValue, str, Rope, Sequence)):
+            self.eprint(f"'foreach' function takes a list, a string or a sequence as it's second argument, {node.tok}", node.tok)
+        return iter(values)
+
+    def run_pfor(self, args: list, node: FunctionCallNode):
+        if not isinstance(args[0], VarAccessNode):
+            self.eprint(f"'pfor' function takes an identifier as it's first argument, {node.tok}", node.tok)
+
+        start_range = self.evaluate(args[1])
+        end_range = self.evaluate(args[2])
+
+        if type(start_range) is not int:
+            self.eprint(f"'pfor' function takes an integer as it's second argument, {node.tok}", node.tok)
+
+        if type(end_range) is not int:
+            self.eprint(f"'pfor' function takes an integer as it's third argument, {node.tok}", node.tok)
 
+        slot = self.slot(args[0])
+        expressions = args[3:]
+        shared = shared_write(expressions, self.frame)
+        if shared is not None:
+            self.eprint(f"'pfor' body can't assign variables defined outside of it or read input, {shared.tok}", shared.tok)
+
+        body = ParallelBody(type(self), self.builtins, self.resolver, list(self.frame), slot, expressions)
+        try:
+            chunks = run_parallel(body, start_range, end_range, self.pfor_workers)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            self.eprint(f"'pfor' body can't run in another process ({e}), {node.tok}", node.tok)
+
+        results = []
+        # chunks come back in order, their output is written as if the loop ran here
+        with contextlib.closing(chunks):
+            for values, text, error in chunks:
+                self.output.write(text)
+                if error is not None:
+                    raise error
+                results += values
+
+        self.frame[slot] = UNSET
+        return ListValue.from_values(results)
+
+    def for_range(self, start: int, end: int):
+        """Values of a 'for' loop counter"""
+        return range(start, end)
+
+    def for_values(self, values):
+        """Values of a 'foreach' loop variable"""
+        return values
+
+    def run_var(self, args: list[Node], node):
         v_name = args[0]
         v_value = args[1]
 
         if not isinstance(v_name, VarAccessNode):
-            self.eprint(f"'var' function an 'identifier' as it's first argument.\n{node.tok}")
-
-        self.variables[v_name.var_name] = v_value
-        return v_value
+            self.eprint(f"'var' function an 'identifier' as it's first argument.\n{node.tok}", node.tok)
+
+        # the binding is returned unevaluated, reading a variable holding it forces it
+        thunk = self.frame[self.slot(v_name)] = self.make_thunk(v_value)
+        return thunk
+
+    def make_thunk(self, node: Node) -> Thunk:
+        slots = self.var_slots.get(node)
+        if slots is None:
+            self.bind(node)
+            slots = self.var_slots[node] = read_slots(node)
+        return Thunk(node, slots)
+
+    def force(self, thunk: Thunk):
+        """Value of a 'var' binding, only evaluated again when a variable its expression reads changed"""
+        if not thunk.current(self.frame):
+            if thunk.forcing:
+                self.eprint(f"'var' expression needs its own value: {thunk.node.tok}", thunk.node.tok)
+            frame = self.frame
+            inputs = [frame[slot] for slot in thunk.slots]
+            thunk.forcing = True
+            try:
+                thunk.value = self.evaluate(thunk.node)
+            finally:
+                thunk.forcing = False
+            thunk.inputs = inputs
+            # the versions of the vars it read, they were forced while it was evaluated
+            thunk.versions = [value.version if type(value) is Thunk else None for value in inputs]
+            thunk.version += 1
+        return thunk.value
     
+    def site_cache(self, node: FunctionCallNode) -> InlineCache | None:
+        """InlineCache of a call site, None on its first call so code running once isn't specialized"""
+        cache = node.cache
+        if cache is None:
+            node.cache = COLD
+            return None
+        if cache is COLD:
+            cache = node.cache = InlineCache()
+        return cache
+
     def run_arithmetic_op(self, func_name, args: list[Node], node):
-        self.arg_error(func_name, len(args), 2, node.tok)
-        
         args = [self.evaluate(arg) if isinstance(arg, Node) else arg for arg in args]
         val1 = args[0]
         val2 = args[1]
 
-        arith_ops = {
-            "add": lambda a, b: a + b,
-            "sub": lambda a, b: a - b,
-            "mul": lambda a, b: a * b,
-            "div": lambda a, b: a / b,
-            "mod": lambda a, b: a % b,
-            "pow": pow
-        }
+        # specialized on the operand types of the previous calls, see InlineCache
+        cache = node.cache
+        if cache is not None and type(val1) is cache.type1 and type(val2) is cache.type2 and (val2 or not cache.nonzero):
+            cache.hits += 1
+            try:
+                return cache.op(val1, val2)
+            except ArithmeticError:
+                # overflows, reported by the generic path
+                pass
+
+        if isinstance(val1, ListValue) or isinstance(val2, ListValue):
+            return self.broadcast_arithmetic(func_name, val1, val2, node)
+
+        type1 = type(val1)
+        type2 = type(val2)
+        cache = self.site_cache(node)
+        if cache is not None:
+            cache.update(type1, type2, arithmetic_op(func_name, type1, type2), func_name in DIVISIONS)
 
         if func_name == "add":
-            if isinstance(val1, str) and isinstance(val2, str):
-                new_val = val1 + val2
-                return new_val
+            if (type1 is str or type1 is Rope) and (type2 is str or type2 is Rope):
+                return concat(val1, val2)
             
-        if isinstance(val1, (int, float)) and isinstance(val2, (int, float)):
-            if func_name == "div" and str(val2) == "0":
-                self.eprint(f"cannot divide by zero at '{node.tok}'")
-            new_val = arith_ops[func_name](val1, val2)
-            return new_val
+        # bools are ints in python but not numbers in FCL
+        if type1 in (int, float) and type2 in (int, float):
+            if func_name in DIVISIONS and val2 == 0:
+                self.eprint(f"cannot divide by zero at '{node.tok}'", node.tok)
+            try:
+                return ARITH_OPS[func_name](val1, val2)
+            except ZeroDivisionError:
+                # pow(0, negative)
+                self.eprint(f"cannot divide by zero at '{node.tok}'", node.tok)
+            except OverflowError:
+                self.eprint(f"'{func_name}' function's result is too large for a float, {node.tok}", node.tok)
         else:
-            self.eprint(f"'{func_name}' function cannot work with types '{type(args[0])}' and '{type(args[1])}', {node.tok}")
+            self.eprint(f"'{func_name}' function cannot work with types '{value_type(args[0])}' and '{value_type(args[1])}', {node.tok}", node.tok)
 
     def run_conditionals(self, func_name, args, node):
-        self.arg_error(func_name, len(args), 2, node.tok)
+        val1 = args[0]
+        val2 = args[1]
+
+        cache = node.cache
+        if cache is not None and type(val1) is cache.type1 and type(val2) is cache.type2:
+            cache.hits += 1
+            return cache.op(val1, val2)
 
-        cond_dict = {
-            "gt": lambda x, y: x > y,
-            "gte": lambda x, y: x >= y,
-            "lt": lambda x, y: x < y,
-            "lte": lambda x, y: x <= y,
-        }
+        if isinstance(val1, ListValue) or isinstance(val2, ListValue):
+            return self.broadcast_comparison(func_name, val1, val2, node)
+
+        type1 = type(val1)
+        type2 = type(val2)
+        cache = self.site_cache(node)
+        if cache is not None:
+            cache.update(type1, type2, comparison_op(func_name, type1, type2))
 
         if func_name == "eq":
-            return BoolNode("true" if args[0] == args[1] else "false", node.tok)
+            return equal(val1, val2)
         elif func_name == "neq":
-            return BoolNode("true" if args[0] != args[1] else "false", node.tok)
-        elif isinstance(args[0], int) and isinstance(args[1], int):
-            res = cond_dict[func_name](args[0], args[1])
-            return BoolNode("true" if res else "false", node.tok)
+            return not equal(val1, val2)
+        elif type1 is int and type2 is int:
+            return COMPARE_OPS[func_name](val1, val2)
         else:
-            self.eprint(f"functions 'gt', 'gte', 'lt', 'lte' only supports numbers, {node.tok}")
+            self.eprint(f"functions 'gt', 'gte', 'lt', 'lte' only supports numbers, {node.tok}", node.tok)
         
 
-
+    def element_pairs(self, func_name, val1, val2, node):
+        """
+        Pairs of operands of an element wise operation, a value that isn't
+        a list is paired with every element of the other one
+        """
+        if isinstance(val1, ListValue) and isinstance(val2, ListValue):
+            if len(val1) != len(val2):
+                self.eprint(f"'{func_name}' function takes lists of the same length, the lengths were {len(val1)} and {len(val2)}, {node.tok}", node.tok)
+            return zip(val1, val2)
+        elif isinstance(val1, ListValue):
+            return ((value, val2) for value in val1)
+        return ((val1, value) for value in val2)
+
+    def broadcast_arithmetic(self, func_name, val1, val2, node):
+        """Arithmetic builtins handed a list work element by element"""
+        pairs = self.element_pairs(func_name, val1, val2, node)
+        result = numpy_arithmetic(func_name, val1, val2)
+        if result is not None:
+            return result
+
+        op = ARITH_OPS[func_name]
+        numbers = (int, float)
+        divides = func_name in DIVISIONS
+
+        # lists of numbers in an array.array, no element needs checking
+        operands = [value.data if isinstance(value, ListValue) and value.typecode else value for value in (val1, val2)]
+        if all(isinstance(operand, array) or type(operand) in numbers for operand in operands):
+            a, b = [repeat(operand) if type(operand) in numbers else operand for operand in operands]
+            if not (divides and (0 in b if isinstance(b, array) else val2 == 0)):
+                try:
+                    return ListValue.from_values(list(map(op, a, b)))
+                except ArithmeticError:
+                    # overflows, the element is reported below
+                    pass
+
+        values = []
+        for a, b in pairs:
+            if type(a) in numbers and type(b) in numbers and not (divides and b == 0):
+                try:
+                    values.append(op(a, b))
+                    continue
+                except ArithmeticError:
+                    pass
+            # strings, nested lists and errors
+            values.append(self.run_arithmetic_op(func_name, [a, b], node))
+        return ListValue.from_values(values)
+
+    def broadcast_comparison(self, func_name, val1, val2, node):
+        """Comparison builtins handed a list give a list of bools"""
+        pairs = self.element_pairs(func_name, val1, val2, node)
+
+        mask = numpy_comparison(func_name, val1, val2)
+        if mask is not None:
+            return ListValue(tuple(mask.tolist()))
+
+        op = COMPARE_OPS.get(func_name)
+        values = []
+        for a, b in pairs:
+            if isinstance(a, ListValue) or isinstance(b, ListValue):
+                values.append(self.broadcast_comparison(func_name, a, b, node))
+            elif func_name == "eq":
+                values.append(equal(a, b))
+            elif func_name == "neq":
+                values.append(not equal(a, b))
+            elif type(a) is int and type(b) is int:
+                values.append(op(a, b))
+            else:
+                values.append(self.run_conditionals(func_name, [a, b], node))
+        return ListValue(tuple(values))
@@ -1,5 +1,12 @@
+from array import array
+from bisect import bisect_right
 from enum import Enum, auto
-import sys
+import codecs
+import mmap
+import os
+import re
+
+from .errors import *
 
 class Type(Enum):
     String = auto()
@@ -16,45 +23,80 @@ class Type(Enum):
     Eof = auto()
 
 class Loc:
-    
-    def __init__(self, file_path: str):
+    __slots__ = ("file_path", "row", "line")
+
+    def __init__(self, file_path: str, line: int = 1, row: int = 0):
         self.file_path = file_path
-        self.row = 0
-        self.line = 1
+        self.row = row
+        self.line = line
 
     def __repr__(self) -> str:
         return f"{self.file_path}:{self.line}:{self.row}"
-    
-    def forward(self, char: str):
-        if char == "\n":
-            self.line += 1
-            self.row = 0
-        else:
-            self.row += 1
 
-    def copy(self):
-        loc = Loc(self.file_path)
-        loc.row = self.row
-        loc.line = self.line
-        return loc
+class Source:
+    """
+    The code being lexed, tokens only keep offsets into it.
+    Lines and columns are computed when a location is needed (mostly for errors)
+    from an index of line starts built on first use.
+    When a file is lexed in chunks, `line` and `row` are where the chunk starts.
+    """
+    __slots__ = ("code", "file_path", "line", "row", "_line_starts")
+
+    def __init__(self, code: str, file_path: str, line: int = 1, row: int = 0):
+        self.code = code
+        self.file_path = file_path
+        self.line = line
+        self.row = row
+        self._line_starts = None
+
+    def line_starts(self) -> list[int]:
+        if self._line_starts is None:
+            self._line_starts = [-self.row] + [match.end() for match in re.finditer("\n", self.code)]
+        return self._line_starts
+
+    def loc(self, offset: int) -> Loc:
+        """
+        Location of the character at `offset`. A newline counts as column 0
+        of the next line and columns start at 1, like the original char by char lexer.
+        """
+        line_starts = self.line_starts()
+        pos = offset + 1
+        line = bisect_right(line_starts, pos)
+        return Loc(self.file_path, self.line + line - 1, pos - line_starts[line - 1])
+
+    def next_chunk(self, code: str, consumed: int):
+        """Source for the code following the first `consumed` characters of this one"""
+        lines = self.code.count("\n", 0, consumed)
+        if lines:
+            row = consumed - (self.code.rfind("\n", 0, consumed) + 1)
+        else:
+            row = self.row + consumed
+        return Source(code, self.file_path, self.line + lines, row)
 
 class Token:
+    __slots__ = ("value", "tt", "start", "end", "source")
 
-    def __init__(self, tt: Type, value: str, stat_loc: Loc, end_loc: Loc = None):
+    def __init__(self, tt: Type, value: str, start: int, end: int, source: Source):
         self.value = value
         self.tt = tt
-        self.start_loc = stat_loc
-        if end_loc is None:
-            self.end_loc = self.start_loc
-        else:
-            self.end_loc = end_loc
+        self.start = start
+        self.end = end
+        self.source = source
+
+    @property
+    def start_loc(self) -> Loc:
+        return self.source.loc(self.start)
+
+    @property
+    def end_loc(self) -> Loc:
+        return self.source.loc(self.end)
 
     def __repr__(self) -> str:
-        return f"{self.start_loc.file_path}:{self.start_loc.line}:{self.start_loc.row}"
+        return repr(self.start_loc)
 
     def __str__(self) -> str:
         return self.__repr__()
-    
+
     def match(self, tt: Type, value: str = None):
         if value is not None:
             return self.tt == tt and self.value == value
@@ -62,123 +104,197 @@ class Token:
             return self.tt == tt
 
 
+# tokens are stored in a TokenArray by the numeric value of their type
+TYPES = {tt.value: tt for tt in Type}
+
+
+class TokenArray:
+    """
+    Tokens of a Source stored as parallel arrays: type codes, start and end offsets
+    and the index of the value in a table of interned strings.
+    Token objects are only created when a token is read, indexing or iterating
+    the array gives Tokens like a list would.
+    """
+
+    def __init__(self, source: Source):
+        self.source = source
+        self.types = array("B")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.values = array("I")
+        self.strings: list[str] = []
+        self.string_index: dict[str, int] = {}
+
+    def append(self, tt: Type, value: str, start: int, end: int) -> None:
+        index = self.string_index.get(value)
+        if index is None:
+            index = self.string_index[value] = len(self.strings)
+            self.strings.append(value)
+        self.types.append(tt.value)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.values.append(index)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, i: int) -> Token:
+        return Token(TYPES[self.types[i]], self.strings[self.values[i]], self.starts[i], self.ends[i], self.source)
+
+    def __iter__(self):
+        strings = self.strings
+        source = self.source
+        for tt, start, end, value in zip(self.types, self.starts, self.ends, self.values):
+            yield Token(TYPES[tt], strings[value], start, end, source)
+
+
+PUNCTUATION = {
+    "=": Type.Equal,
+    "(": Type.LeftParen,
+    ")": Type.RightParen,
+    "[": Type.LeftSquareBracket,
+    "]": Type.RightSquareBracket,
+    ",": Type.Comma,
+}
+
+# one alternative per kind of token, the scanner matches whole tokens at once
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>\#[^\n]*\n?)
+  | (?P<punctuation>[=()\[\],])
+  | (?P<string>'[^']*'|"[^"]*")
+  | (?P<unterminated>['"])
+  | (?P<number>\d[\d.]*)
+  | (?P<identifier>[^\W\d_]\w*)
+  | (?P<invalid>.)
+""", re.VERBOSE | re.DOTALL)
+
+
 class Lexer:
-    
+
     def __init__(self, code: str, file_path: str):
         self.code = code
+        self.source = Source(code, file_path)
+        self.tokens = TokenArray(self.source)
 
-        self.loc = Loc(file_path)
-        self.tokens = []
-        self.char: str = None # current char
-        self.char_indx = 0
+    def tokenize(self) -> None:
+        end = self.scan(self.code, self.source, True, self.tokens)
+        self.tokens.append(Type.Eof, "EOF", end, end)
 
-        # consume first character
-        self.advance()
+    def iter_tokens(self):
+        return iter(self.tokens)
 
-    def advance(self) -> None:
-        if self.char_indx < len(self.code):
-            self.char = self.code[self.char_indx]
-        else:
-            self.char = None
-        
-        self.loc.forward(self.char)
-        self.char_indx += 1
+    def scan(self, code: str, source: Source, final: bool, tokens: TokenArray) -> int:
+        """
+        Append the tokens of `code` to `tokens` and return the offset where scanning stopped.
+        Unless `final`, it stops before a token that touches the end of `code`
+        since the rest of it might still come in the next chunk.
+        """
+        append = tokens.append
+        match_token = TOKEN_RE.match
+        pos = 0
+        eof = len(code)
+
+        while pos < eof:
+            match = match_token(code, pos)
+            kind = match.lastgroup
+            end = match.end()
+
+            if not final and (end == eof or kind == "unterminated"):
+                return pos
+
+            if kind == "space":
+                pass
+            elif kind == "identifier":
+                text = match.group()
+                if not text.isascii():
+                    end = self.identifier_end(code, source, pos, end)
+                    text = code[pos:end]
+                tt = Type.Bool if text == "true" or text == "false" else Type.Identifier
+                append(tt, text, pos, end)
+            elif kind == "punctuation":
+                char = match.group()
+                append(PUNCTUATION[char], char, pos, pos)
+            elif kind == "number":
+                append(Type.Number, match.group(), pos, end)
+            elif kind == "string":
+                append(Type.String, code[pos + 1:end - 1], pos, end)
+            elif kind == "comment":
+                if end == eof and not match.group().endswith("\n"):
+                    # a comment running into the end of the file steps one past it
+                    return end + 1
+            elif kind == "unterminated":
+                loc = source.loc(pos)
+                raise LexError(f"Invalid Syntax, Expected \"'\" or \"'\", at line {loc.line}", loc=loc)
+            else:
+                loc = source.loc(pos)
+                raise LexError(f"Invalid Syntax: {loc}", loc=loc)
 
-    def valid(self) -> bool:
-        """Check if current character is not none"""
-        return self.char is not None
+            pos = end
 
-    def iss(self, value: str) -> bool:
-        return self.char == value
-    
-    def is_not(self, value: str) -> bool:
-        return self.char != value
+        return pos
 
-    def peek(self, idx: int) -> str | None:
-        if idx < len(self.code):
-            return self.code[idx]
-        return None
+    def identifier_end(self, code: str, source: Source, start: int, end: int) -> int:
+        """
+        The regex accepts any alphanumeric character in identifiers, but they only
+        start with a letter and continue with letters, decimals and '_'
+        """
+        if not code[start].isalpha():
+            loc = source.loc(start)
+            raise LexError(f"Invalid Syntax: {loc}", loc=loc)
 
-    def append(self, value) -> None:
-        self.tokens.append(value)
+        pos = start + 1
+        while pos < end and (code[pos].isalpha() or code[pos].isdecimal() or code[pos] == "_"):
+            pos += 1
+        return pos
+
+
+class StreamLexer(Lexer):
+    """
+    Lexes a file lazily: the file is memory mapped and decoded chunk by chunk
+    and `iter_tokens` yields tokens as the chunks are scanned, so only the
+    current chunk (plus a token cut in half by it) is held in memory.
+    Token offsets are relative to the chunk's Source.
+    """
+
+    def __init__(self, file_path: str, chunk_size: int = 1 << 20):
+        super().__init__("", file_path)
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.tokens = None
 
     def tokenize(self) -> None:
-        while self.valid():
-            if self.char.isspace():
-                self.advance()
-            elif self.iss("="):
-                self.append(Token(Type.Equal, self.char, self.loc.copy()))
-                self.advance()
-            elif self.iss("#"):
-                self.advance()
-                while self.valid() and self.is_not("\n"):
-                    self.advance()
-                self.advance()
-            elif self.iss("("):
-                self.append(Token(Type.LeftParen, self.char, self.loc.copy()))
-                self.advance()
-            elif self.iss(")"):
-                self.append(Token(Type.RightParen, self.char, self.loc.copy()))
-                self.advance()
-            elif self.iss("["):
-                self.append(Token(Type.LeftSquareBracket, self.char, self.loc.copy()))
-                self.advance()
-            elif self.iss("]"):
-                self.append(Token(Type.RightSquareBracket, self.char, self.loc.copy()))
-                self.advance()
-            elif self.iss(","):
-                self.append(Token(Type.Comma, self.char, self.loc.copy()))
-                self.advance()
-            elif self.iss("'") or self.iss("\""):
-                self.parse_string()
-            elif self.char.isdecimal():
-                self.parse_number()
-            elif self.char.isalpha():
-                self.parse_identifier()
-            else:
-                print(f"Invalid Syntax: {self.loc}")
-                exit(1)
-
-        self.tokens.append(Token(Type.Eof, "EOF", self.loc))
-
-    def parse_string(self):
-        quote = self.char
-        start_loc = self.loc.copy()
-
-        self.advance()
-        parsed = ""
-        
-        while self.valid() and self.is_not(quote):
-            parsed += self.char
-            self.advance()
-        
-        if self.is_not(quote):
-            print(f"Invalid Syntax, Expected \"'\" or \"'\", at line {start_loc.line}")
-            sys.exit(1)
-        self.advance()
-
-        self.append(Token(Type.String, parsed, start_loc, self.loc.copy()))
-
-    def parse_number(self):
-        parsed = ""
-        start_loc = self.loc.copy()
-
-        while self.valid() and (self.char.isdecimal() or self.iss(".")):
-            parsed += self.char
-            self.advance()
-
-        self.append(Token(Type.Number, parsed, start_loc, self.loc.copy()))
-
-    def parse_identifier(self):
-        start_loc = self.loc.copy()
-        parsed = self.char
-        self.advance()
-
-        while self.valid() and (self.char.isalpha() or self.char.isdecimal() or self.iss("_")):
-            parsed += self.char
-            self.advance()
-        
-        if parsed == "true" or parsed == "false":
-            self.append(Token(Type.Bool, parsed, start_loc, self.loc.copy()))
-        else:
-            self.append(Token(Type.Identifier, parsed, start_loc, self.loc.copy()))
+        self.tokens = list(self.stream())
+
+    def iter_tokens(self):
+        return iter(self.tokens) if self.tokens is not None else self.stream()
+
+    def chunks(self):
+        """Decoded text of the file, chunk by chunk"""
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        with open(self.file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for start in range(0, len(data), self.chunk_size):
+                    yield decoder.decode(data[start:start + self.chunk_size])
+        yield decoder.decode(b"", final=True)
+
+    def stream(self):
+        source = Source("", self.file_path)
+        pending = ""
+
+        for chunk in self.chunks():
+            code = pending + chunk
+            source = source.next_chunk(code, len(source.code) - len(pending))
+            tokens = TokenArray(source)
+            end = self.scan(code, source, False, tokens)
+            yield from tokens
+            pending = code[end:]
+
+        # whatever is left is scanned as the end of the file
+        source = source.next_chunk(pending, len(source.code) - len(pending))
+        tokens = TokenArray(source)
+        end = self.scan(pending, source, True, tokens)
+        tokens.append(Type.Eof, "EOF", end, end)
+        yield from tokens
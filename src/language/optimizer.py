@@ -0,0 +1,229 @@
+import time
+
+from .builtins import *
+from .pparser import *
+
+
+class Optimizer:
+    """
+    Rewrites the ast between parsing and running it. Every pass can be switched
+    on or off and counts the nodes it changed:
+
+        literals  - converts number literals to their runtime value once
+        branches  - drops if/elif branches whose condition is constant
+        fold      - evaluates pure builtins called with constant arguments, add(5, 5) -> 10
+
+    branches runs before fold so dead code isn't folded and again after it
+    for the conditions fold made constant.
+    """
+
+    PASSES = ("literals", "branches", "fold")
+    PIPELINE = ("literals", "branches", "fold", "branches")
+    # ints folded by 'mul' and 'pow' stay under this size, a big one
+    # takes longer to compute than running the program would
+    max_fold_bits = 1 << 16
+
+    def __init__(self, passes=PASSES, builtins: BuiltinRegistry = None):
+        for name in passes:
+            if name not in self.PASSES:
+                raise ValueError(f"unknown optimizer pass '{name}', expected one of {', '.join(self.PASSES)}")
+
+        # keep the pipeline order no matter how the passes were given
+        self.passes = [name for name in self.PASSES if name in passes]
+        self.builtins = BUILTINS if builtins is None else builtins
+        self.changes = {name: 0 for name in self.passes}
+        self.times = {name: 0.0 for name in self.passes}
+
+    def optimize(self, node: Node) -> Node:
+        """Optimize a whole Program or a single statement, returns the rewritten node"""
+        for name in self.PIPELINE:
+            if name not in self.passes:
+                continue
+            start = time.perf_counter()
+            node = self.transform(node, getattr(self, f"pass_{name}"), name)
+            self.times[name] += time.perf_counter() - start
+        return node
+
+    def report(self) -> str:
+        lines = [f"{'pass':<10} {'changes':>8} {'time (ms)':>10}"]
+        for name in self.passes:
+            lines.append(f"{name:<10} {self.changes[name]:>8} {self.times[name] * 1000:>10.3f}")
+        return "\n".join(lines)
+
+    def transform(self, node: Node, rewrite, name: str) -> Node:
+        """Rewrite the children of `node` and then the node itself, bottom up"""
+        # rewritten nodes, the children of a node are on top when it's rewritten
+        done = []
+        stack = [(node, False)]
+        while stack:
+            current, ready = stack.pop()
+            children = self.children(current)
+            if not ready:
+                stack.append((current, True))
+                if isinstance(current, AssignmentNode):
+                    stack.append((current.expr, False))
+                stack.extend((child, False) for child in reversed(children))
+                continue
+
+            if children:
+                children[:] = done[len(done) - len(children):]
+                del done[len(done) - len(children):]
+            if isinstance(current, AssignmentNode):
+                current.expr = done.pop()
+
+            new_node = rewrite(current)
+            if new_node is not current:
+                self.changes[name] += 1
+            done.append(new_node)
+        return done[0]
+
+    def children(self, node: Node) -> list[Node]:
+        """The list holding the child nodes of `node` (an assignment's expression isn't in one)"""
+        if isinstance(node, (Program, BlockNode)):
+            return node.statements
+        elif isinstance(node, FunctionCallNode):
+            return node.args
+        elif isinstance(node, ListNode):
+            return node.values
+        return []
+
+    def builtin_of(self, node: Node) -> Builtin | None:
+        if not isinstance(node, FunctionCallNode):
+            return None
+        builtin = self.builtins.get(node.func_name)
+        if builtin is None or not builtin.accepts(len(node.args)):
+            return None
+        return builtin
+
+    def pass_literals(self, node: Node) -> Node:
+        if isinstance(node, NumberNode):
+            try:
+                value = float(node.value) if "." in node.value else int(node.value)
+            except ValueError:
+                # malformed numbers still have to fail at runtime
+                return node
+            return ConstNode(value, node.value, node.tok)
+        return node
+
+    def pass_fold(self, node: Node) -> Node:
+        builtin = self.builtin_of(node)
+        # 'and' and 'or' take their arguments unevaluated but are pure
+        if builtin is None or (not builtin.strict and builtin.func is not builtin_logical):
+            return node
+
+        args = [self.const_value(arg) for arg in node.args]
+        if any(arg is NotImplemented for arg in args):
+            return node
+
+        value = self.fold(builtin, node.func_name, args)
+        if value is NotImplemented:
+            return node
+        elif isinstance(value, bool):
+            return BoolNode(value, node.tok)
+        # formatted only when printed, str() of a big int can raise
+        return ConstNode(value, None, node.tok)
+
+    def const_value(self, node: Node):
+        """Runtime value of a constant node or NotImplemented"""
+        if isinstance(node, (ConstNode, StringNode)):
+            return node.value
+        elif isinstance(node, NumberNode):
+            literal = self.pass_literals(node)
+            return literal.value if isinstance(literal, ConstNode) else NotImplemented
+        elif isinstance(node, BoolNode):
+            return node.value
+        return NotImplemented
+
+    def fold(self, builtin: Builtin, func_name: str, args: list):
+        """
+        Computes a pure builtin at compile time, returns NotImplemented
+        whenever the call would fail so the error still happens at runtime
+        """
+        numbers = (int, float)
+        func = builtin.func
+
+        if func is builtin_arithmetic:
+            val1, val2 = args
+            if func_name == "add" and isinstance(val1, str) and isinstance(val2, str):
+                return val1 + val2
+            if type(val1) not in numbers or type(val2) not in numbers:
+                return NotImplemented
+            if type(val1) is int and type(val2) is int and self.result_bits(func_name, val1, val2) > self.max_fold_bits:
+                return NotImplemented
+            try:
+                return ARITH_OPS[func_name](val1, val2)
+            except ArithmeticError:
+                return NotImplemented
+        elif func is builtin_conditional:
+            val1, val2 = args
+            if func_name in ("eq", "neq"):
+                return equal(val1, val2) if func_name == "eq" else not equal(val1, val2)
+            elif type(val1) is int and type(val2) is int:
+                return COMPARE_OPS[func_name](val1, val2)
+        elif func is builtin_logical:
+            return all(args) if func_name == "and" else any(args)
+        elif func is builtin_str:
+            try:
+                return format_value(args[0])
+            except ValueError:
+                # over python's digit limit
+                return NotImplemented
+        elif func is builtin_len and isinstance(args[0], str):
+            return len(args[0])
+
+        return NotImplemented
+
+    @staticmethod
+    def result_bits(func_name: str, val1: int, val2: int) -> int:
+        """About how many bits the int result of `func_name` has, without computing it"""
+        if func_name == "mul":
+            return val1.bit_length() + val2.bit_length()
+        elif func_name == "pow" and val2 > 0:
+            return val1.bit_length() * val2
+        return max(val1.bit_length(), val2.bit_length()) + 1
+
+    def pass_branches(self, node: Node) -> Node:
+        builtin = self.builtin_of(node)
+        if builtin is None or builtin.func is not builtin_if:
+            return node
+
+        cond, then_expr, *clauses = node.args
+        cond_value = self.const_value(cond)
+        if cond_value is not NotImplemented and cond_value:
+            return then_expr
+
+        # elif arguments are checked at runtime before any condition, keep the error
+        if any(self.is_elif(clause) and len(clause.args) != 2 for clause in clauses):
+            return node
+
+        kept = []
+        else_expr = None
+        for i, clause in enumerate(clauses):
+            if self.is_elif(clause):
+                value = self.const_value(clause.args[0])
+                if value is NotImplemented:
+                    kept.append(clause)
+                elif value:
+                    else_expr = clause.args[1]
+                    break
+            elif i == len(clauses) - 1:
+                else_expr = clause
+            else:
+                # invalid syntax, reported at runtime
+                return node
+
+        if cond_value is not NotImplemented:
+            # the condition is false, only the elifs and the else can run
+            if len(kept) == 0:
+                return else_expr if else_expr is not None else ConstNode(None, "None", node.tok)
+            # the first elif left becomes the condition
+            cond, then_expr = kept[0].args
+            kept = kept[1:]
+
+        args = [cond, then_expr] + kept + ([else_expr] if else_expr is not None else [])
+        if args == node.args:
+            return node
+        return FunctionCallNode(node.func_name, args, node.tok)
+
+    def is_elif(self, node: Node) -> bool:
+        return isinstance(node, FunctionCallNode) and node.func_name == "elif"
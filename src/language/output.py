@@ -0,0 +1,53 @@
+import sys
+
+
+class BufferedSink:
+    """
+    Where 'log' writes. Output is kept in memory and written to `stream`
+    (sys.stdout when None) once `buffer_size` characters are pending,
+    and whenever the interpreter flushes it: when a run ends, before 'input'
+    shows its prompt and before an error message is printed.
+    A buffer_size of 0 writes every line right away.
+    """
+
+    BUFFER_SIZE = 1 << 16
+
+    def __init__(self, stream=None, buffer_size: int = BUFFER_SIZE):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.parts: list[str] = []
+        self.pending = 0
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.pending += len(text)
+        if self.pending >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.parts:
+            return
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.write("".join(self.parts))
+        stream.flush()
+        self.parts.clear()
+        self.pending = 0
+
+
+class MemorySink:
+    """Keeps all the output in memory, for embedding and tests"""
+
+    def __init__(self):
+        self.parts: list[str] = []
+
+    def write(self, text: str):
+        self.parts.append(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
+    def clear(self):
+        self.parts.clear()
@@ -0,0 +1,145 @@
+import contextlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from .output import MemorySink
+from .pparser import *
+from .resolver import *
+
+
+class ParallelBody:
+    """
+    The body of a pfor with everything needed to run its iterations in another process:
+    the engine class, the builtins, the variable slots and a copy of the frame
+    from when the pfor started. Every worker unpickles it once.
+    """
+
+    def __init__(self, engine, builtins, resolver, frame: list, slot: int, body: list[Node]):
+        self.engine = engine
+        self.builtins = builtins
+        self.resolver = resolver
+        self.frame = frame
+        self.slot = slot
+        self.body = body
+        self.interp = None
+        self.stats = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["interp"] = None
+        state["stats"] = None
+        return state
+
+    def start(self):
+        """Create the interpreter running the iterations, once per process"""
+        output = MemorySink()
+        interp = self.engine(Program(self.body[0].tok), self.builtins, output)
+        interp.resolver = self.resolver
+        interp.frame = list(self.frame)
+        # workers can't start processes of their own, nested pfors run in the worker
+        interp.pfor_workers = 1
+        self.interp = interp
+        self.stats = [interp.prepare(expr) for expr in self.body]
+
+    def run(self, start: int, end: int):
+        """
+        Run the iterations start to end, returns the value of every iteration, their
+        output and the exception that stopped them (None if they all ran)
+        """
+        if self.interp is None:
+            self.start()
+
+        interp = self.interp
+        output = interp.output
+        output.clear()
+        frame = interp.frame
+        initial = self.frame
+        slot = self.slot
+        results = []
+
+        # anything printed instead of logged stays in iteration order too
+        with contextlib.redirect_stdout(output):
+            try:
+                for i in range(start, end):
+                    # every iteration starts from the variables the pfor started with
+                    frame[:] = initial
+                    frame[slot] = i
+                    value = None
+                    for stat in self.stats:
+                        value = stat()
+                    results.append(value)
+            except BaseException as e:
+                return results, output.getvalue(), e
+
+        return results, output.getvalue(), None
+
+
+def shared_write(nodes: list[Node], frame: list) -> Node | None:
+    """
+    First node under `nodes` that assigns a variable defined outside of them
+    or reads input, iterations running in other processes can't share those
+    """
+    stack = list(nodes)
+    while stack:
+        current = stack.pop()
+        if isinstance(current, AssignmentNode):
+            if frame[current.slot] is not UNSET:
+                return current
+            stack.append(current.expr)
+        elif isinstance(current, (Program, BlockNode)):
+            stack.extend(current.statements)
+        elif isinstance(current, FunctionCallNode):
+            if current.func_name == "input":
+                return current
+            target = current.args[0] if current.args else None
+            if current.func_name in ("var", "for", "foreach", "pfor") and isinstance(target, VarAccessNode) and frame[target.slot] is not UNSET:
+                return current
+            stack.extend(current.args)
+        elif isinstance(current, ListNode):
+            stack.extend(current.values)
+        elif isinstance(current, ElifNode):
+            stack.append(current.cond)
+            stack.append(current.expr)
+    return None
+
+
+# the ParallelBody of the pfor a worker process is running
+worker_body: ParallelBody = None
+
+def init_worker(payload: bytes):
+    global worker_body
+    worker_body = pickle.loads(payload)
+
+def run_chunk(bounds: tuple[int, int]):
+    return worker_body.run(*bounds)
+
+
+def chunks(start: int, end: int, workers: int) -> list[tuple[int, int]]:
+    """Split the range into a few chunks per worker so slow iterations even out"""
+    size = max(1, -(-(end - start) // (workers * 4)))
+    return [(i, min(i + size, end)) for i in range(start, end, size)]
+
+def run_parallel(body: ParallelBody, start: int, end: int, workers: int = None):
+    """
+    Iterator of (results, output, exception) for the chunks of the range in order,
+    run in worker processes unless there is a single worker or a single iteration.
+    The body is pickled right away, raises if it can't be.
+    """
+    workers = os.cpu_count() or 1 if workers is None else workers
+    if workers <= 1 or end - start <= 1:
+        return run_inline(body, start, end)
+
+    payload = pickle.dumps(body, pickle.HIGHEST_PROTOCOL)
+    return run_pool(payload, chunks(start, end, workers), workers)
+
+def run_inline(body: ParallelBody, start: int, end: int):
+    yield body.run(start, end)
+
+def run_pool(payload: bytes, bounds: list[tuple[int, int]], workers: int):
+    pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(payload,))
+    try:
+        yield from pool.map(run_chunk, bounds)
+    finally:
+        # chunks after a failed one are never looked at
+        pool.shutdown(cancel_futures=True)
@@ -1,14 +1,17 @@
+from .errors import *
 from .lexer import Lexer, Type, Token
 
 
 class Node:
+    """Base of the ast nodes, they use __slots__ so a parsed program stays small"""
+    __slots__ = ("tok",)
+
     def __init__(self, tok: Token) -> None:
         self.tok = tok
 
-    def is_true(self) -> bool:
-        return True
-
 class Program(Node):
+    __slots__ = ("statements",)
+
     def __init__(self, tok):
         super().__init__(tok)
         self.statements: list[Node] = []
@@ -17,6 +20,8 @@ class Program(Node):
         return f"Program<{hex(id(self))}>({self.statements})"
 
 class BlockNode(Node):
+    __slots__ = ("statements",)
+
     def __init__(self, statements, tok):
         super().__init__(tok)
         self.statements: list[Node] = statements
@@ -25,35 +30,47 @@ class BlockNode(Node):
         return f"Block<{hex(id(self))}>({self.statements})"
 
 class FunctionCallNode(Node):
+    __slots__ = ("func_name", "args", "builtin", "registry", "cache")
+
     def __init__(self, func_name, args, tok: Token):
         super().__init__(tok)
         self.func_name = func_name
         self.args = args
+        # resolved by the interpreter on the first call, in the BuiltinRegistry `registry`
+        self.builtin = None
+        self.registry = None
+        # InlineCache of arithmetic and comparison calls, created on the first call
+        self.cache = None
 
     def __repr__(self):
         return f"FunctionCallNode<{hex(id(self))}>({self.func_name}, {self.args})"
 
 class AssignmentNode(Node):
+    __slots__ = ("var_name", "expr", "slot")
+
     def __init__(self, var_name, expr, tok: Token):
         super().__init__(tok)
         self.var_name = var_name
         self.expr = expr
+        # frame slot, set by the resolver
+        self.slot = None
 
     def __repr__(self):
         return f"AssignmentNode<{hex(id(self))}>({self.var_name}, {self.expr})"
     
 class StringNode(Node):
+    __slots__ = ("value",)
+
     def __init__(self, value, tok: Token):
         super().__init__(tok)
         self.value = value
 
     def __repr__(self):
         return self.value
-    
-    def is_true(self) -> bool:
-        return len(self.value) > 0
 
 class NumberNode(Node):
+    __slots__ = ("value",)
+
     def __init__(self, value, tok: Token):
         super().__init__(tok)
         self.value = value
@@ -61,40 +78,43 @@ class NumberNode(Node):
     def __repr__(self):
         return str(self.value)
     
-    def is_true(self) -> bool:
-        return self.value != 0
-    
 class ListNode(Node):
+    __slots__ = ("values", "constant")
+
     def __init__(self, values: list[Node], tok: Token):
         super().__init__(tok)
         self.values = values
+        # the ListValue of a list of literals, set by the interpreter the first time it's created
+        self.constant = None
 
     def __repr__(self):
         return str(self.value)
-    
-    def is_true(self) -> bool:
-        return len(self.value) != 0
 
 class VarAccessNode(Node):
+    __slots__ = ("var_name", "slot")
+
     def __init__(self, var_name, tok: Token):
         super().__init__(tok)
         self.var_name = var_name
+        # frame slot, set by the resolver
+        self.slot = None
 
     def __repr__(self):
         return f"VarAccessNode({self.var_name})"
 
 class BoolNode(Node):
-    def __init__(self, value, tok: Token):
+    __slots__ = ("value",)
+
+    def __init__(self, value: bool, tok: Token):
         super().__init__(tok)
         self.value = value
 
     def __repr__(self):
-        return self.value
-    
-    def is_true(self) -> bool:
-        return (True if self.value == "true" else False)
+        return "true" if self.value else "false"
     
 class ElifNode(Node):
+    __slots__ = ("cond", "expr")
+
     def __init__(self, cond: Node, expr, tok: Token):
         super().__init__(tok)
         self.cond = cond
@@ -103,143 +123,141 @@ class ElifNode(Node):
     def __repr__(self):
         return f"ElifNode<{hex(id(self))}>({self.cond} ---- {self.expr})"
     
-    def is_true(self) -> bool:
-        return self.cond.is_true()
-    
-class NoneNode(Node):
-    def __init__(self, tok: Token):
+class ConstNode(Node):
+    """Value known before running, produced by the optimizer. `text` is how it prints inside lists, None when it prints like its value"""
+    __slots__ = ("value", "text")
+
+    def __init__(self, value, text: str | None, tok: Token):
         super().__init__(tok)
+        self.value = value
+        self.text = text
 
     def __repr__(self):
-        return "None"
+        return self.text if self.text is not None else repr(self.value)
 
 
 class Parser:
     def __init__(self, lexer: Lexer):
         self.lexer = lexer
-        self.tokens = lexer.tokens
+        self.tokens = None
         self.current_token = None
+        self.next_token = None
         self.token_index = 0
 
     def parse(self):
-        self.current_token = self.tokens[self.token_index]
+        self.start()
         ast = self.program()
         return ast
 
+    def start(self):
+        """Begin reading tokens from the lexer, they are pulled one at a time with a single token lookahead"""
+        self.tokens = self.lexer.iter_tokens()
+        self.current_token = next(self.tokens)
+        self.next_token = next(self.tokens, self.current_token)
+
     def program(self):
         ast = Program(self.current_token)
+        ast.statements.extend(self.statements())
+        return ast
+
+    def statements(self):
+        """Yield the top level statements as soon as each one is parsed"""
+        if self.current_token is None:
+            self.start()
+
         while self.current_token.tt != Type.Eof:
             if self.current_token.tt == Type.Identifier:
-                if self.peek().tt == Type.Equal:
-                    ast.statements.append(self.assignment_statement())
-                elif self.peek().tt == Type.LeftParen:
-                    ast.statements.append(self.function_call())
+                if self.peek().tt in (Type.Equal, Type.LeftParen):
+                    yield self.expr()
                 else:
-                    print(f"Invalid Syntax: {self.current_token}")
-                    exit(1)
+                    raise ParseError(f"Invalid Syntax: {self.current_token}", self.current_token)
             elif self.current_token.tt == Type.LeftParen:
-                ast.statements.append(self.block())
+                yield self.expr()
             else:
-                print(f"Invalid Syntax: {self.current_token}")
-                exit(1)
-        return ast
+                raise ParseError(f"Invalid Syntax: {self.current_token}", self.current_token)
 
-    def assignment_statement(self):
-        curr_tok = self.current_token
-        var_name = self.current_token.value
-        self.eat(Type.Identifier)
-        self.eat(Type.Equal)
-        expr = self.expr()
-        return AssignmentNode(var_name, expr, curr_tok)
-
-    def function_call(self):
-        curr_tok = self.current_token
-        func_name = self.current_token.value
-        self.eat(Type.Identifier)
-        self.eat(Type.LeftParen)
-        args = []
-        while self.current_token.tt != Type.RightParen:
-            args.append(self.expr())
-            if self.current_token.tt == Type.Comma:
-                self.eat(Type.Comma)
-            elif self.current_token.tt != Type.RightParen:
-                print(f"Expected comma or ')' after each argument at {self.current_token}")
-                exit(1)
-        self.eat(Type.RightParen)
-        return FunctionCallNode(func_name, args, curr_tok)
-    
     def expr(self):
-        curr_tok = self.current_token
-        if self.current_token.tt == Type.String:
-            value = self.current_token.value
-            self.eat(Type.String)
-            return StringNode(value, curr_tok)
-        elif self.current_token.tt == Type.Number:
-            value = self.current_token.value
-            self.eat(Type.Number)
-            return NumberNode(value, curr_tok)
-        elif self.current_token.tt == Type.Bool:
-            value = self.current_token.value
-            self.eat(Type.Bool)
-            return BoolNode(value, curr_tok)
-        elif self.current_token.tt == Type.Identifier:
-            if self.peek().tt == Type.LeftParen:
-                return self.function_call()
-            elif self.peek().tt == Type.Equal:
-                return self.assignment_statement()
-            var_name = self.current_token.value
-            self.eat(Type.Identifier)
-            return VarAccessNode(var_name, curr_tok)
-        elif self.current_token.tt == Type.LeftParen:
-            return self.block()
-        elif self.current_token.tt == Type.LeftSquareBracket:
-            return self.list_expr()
-        else:
-            print(f"Invalid Expression: {self.current_token}")
-            exit(1)
-
-    def block(self):
-        curr_tok = self.current_token
-        self.eat(Type.LeftParen)
-        statements = []
-        while self.current_token.tt != Type.RightParen:
-            statements.append(self.expr())
-            if self.current_token.tt == Type.Comma:
-                self.eat(Type.Comma)
-
-        self.eat(Type.RightParen)
-
-        return BlockNode(statements, curr_tok)
-    
-    def list_expr(self):
-        curr_tok = self.current_token
-        self.eat(Type.LeftSquareBracket)
-        items = []
-        while self.current_token.tt != Type.RightSquareBracket:
-            items.append(self.expr())
-            if self.current_token.tt == Type.Comma:
-                self.eat(Type.Comma)
-            elif self.current_token.tt != Type.RightSquareBracket:
-                print(f"Expected comma or ']' after list item at {self.current_token}")
-                exit(1)
-        self.eat(Type.RightSquareBracket)
-        return ListNode(items, curr_tok)
+        """
+        Parse one expression. Function calls, blocks, lists and assignments that are still
+        open are kept on an explicit stack instead of recursing, so nesting isn't limited
+        by python's recursion limit
+        """
+        # (node class, token, name, parsed children) of the open nodes, innermost last
+        stack = []
+        while True:
+            curr_tok = self.current_token
+            node = None
+            if curr_tok.tt == Type.String:
+                self.eat(Type.String)
+                node = StringNode(curr_tok.value, curr_tok)
+            elif curr_tok.tt == Type.Number:
+                self.eat(Type.Number)
+                node = NumberNode(curr_tok.value, curr_tok)
+            elif curr_tok.tt == Type.Bool:
+                self.eat(Type.Bool)
+                node = BoolNode(curr_tok.value == "true", curr_tok)
+            elif curr_tok.tt == Type.Identifier:
+                next_tt = self.peek().tt
+                self.eat(Type.Identifier)
+                if next_tt == Type.LeftParen:
+                    self.eat(Type.LeftParen)
+                    stack.append((FunctionCallNode, curr_tok, curr_tok.value, []))
+                elif next_tt == Type.Equal:
+                    self.eat(Type.Equal)
+                    stack.append((AssignmentNode, curr_tok, curr_tok.value, None))
+                    continue
+                else:
+                    node = VarAccessNode(curr_tok.value, curr_tok)
+            elif curr_tok.tt == Type.LeftParen:
+                self.eat(Type.LeftParen)
+                stack.append((BlockNode, curr_tok, None, []))
+            elif curr_tok.tt == Type.LeftSquareBracket:
+                self.eat(Type.LeftSquareBracket)
+                stack.append((ListNode, curr_tok, None, []))
+            else:
+                raise ParseError(f"Invalid Expression: {curr_tok}", curr_tok)
+
+            # add the node to the innermost open one and close every node that ends after it
+            while stack:
+                kind, tok, name, children = stack[-1]
+                closing = Type.RightSquareBracket if kind is ListNode else Type.RightParen
+                if node is not None:
+                    if kind is AssignmentNode:
+                        stack.pop()
+                        node = AssignmentNode(name, node, tok)
+                        continue
+
+                    children.append(node)
+                    if self.current_token.tt == Type.Comma:
+                        self.eat(Type.Comma)
+                    elif self.current_token.tt != closing and kind is FunctionCallNode:
+                        raise ParseError(f"Expected comma or ')' after each argument at {self.current_token}", self.current_token)
+                    elif self.current_token.tt != closing and kind is ListNode:
+                        raise ParseError(f"Expected comma or ']' after list item at {self.current_token}", self.current_token)
+
+                if self.current_token.tt != closing:
+                    # parse the next child
+                    break
+
+                self.eat(closing)
+                stack.pop()
+                if kind is FunctionCallNode:
+                    node = FunctionCallNode(name, children, tok)
+                elif kind is BlockNode:
+                    node = BlockNode(children, tok)
+                else:
+                    node = ListNode(children, tok)
+            else:
+                return node
 
     def eat(self, tt: Type):
         if self.current_token.tt == tt:
             self.token_index += 1
-            if self.token_index < len(self.tokens):
-                self.current_token = self.tokens[self.token_index]
-            else:
-                self.current_token = Token(Type.Eof, "EOF")
+            self.current_token = self.next_token
+            # the Eof token repeats once the tokens run out
+            self.next_token = next(self.tokens, self.current_token)
         else:
-            print(f"Invalid Syntax: {self.current_token}, Expected: {tt}")
-            exit(1)
+            raise ParseError(f"Invalid Syntax: {self.current_token}, Expected: {tt}", self.current_token)
 
     def peek(self):
-        if self.token_index + 1 < len(self.tokens):
-            return self.tokens[self.token_index + 1]
-        else:
-            return Token(Type.Eof, "EOF")
-        
-
+        return self.next_token
@@ -0,0 +1,120 @@
+import time
+
+from .builtins import *
+from .interpreter import Interpreter
+from .pparser import *
+
+
+class Stats:
+    """Calls and time of one builtin or source line, `total` includes the calls made inside it"""
+    __slots__ = ("calls", "total", "self_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+
+
+class Profiler:
+    """
+    Collects the calls of a ProfilingInterpreter by builtin name, by source line
+    and by call stack. Stacks are kept in the collapsed format flamegraph tools read,
+    one "outer;inner;innermost <self time in microseconds>" line per stack.
+    """
+
+    SORT_KEYS = ("self", "total", "calls")
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.builtins: dict[str, Stats] = {}
+        self.lines: dict[tuple[str, int], Stats] = {}
+        self.stacks: dict[str, float] = {}
+        # frames of the calls running now: [stack, name, line, time spent in calls made inside it, start]
+        self.stack = []
+        # how many calls of a builtin or line are running, recursive calls only count once in `total`
+        self.active: dict = {}
+        self.locations: dict[Node, tuple[tuple[str, int], str]] = {}
+
+    def location(self, node: FunctionCallNode):
+        location = self.locations.get(node)
+        if location is None:
+            loc = node.tok.start_loc
+            line = (loc.file_path, loc.line)
+            location = self.locations[node] = (line, f"{node.func_name} ({loc.file_path}:{loc.line})")
+        return location
+
+    def enter(self, node: FunctionCallNode):
+        line, frame = self.location(node)
+        stack = f"{self.stack[-1][0]};{frame}" if self.stack else frame
+        active = self.active
+        active[node.func_name] = active.get(node.func_name, 0) + 1
+        active[line] = active.get(line, 0) + 1
+        self.stack.append([stack, node.func_name, line, 0.0, self.clock()])
+
+    def exit(self):
+        stack, name, line, inner, start = self.stack.pop()
+        elapsed = self.clock() - start
+        if self.stack:
+            self.stack[-1][3] += elapsed
+
+        self_time = elapsed - inner
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + self_time
+        for key, table in ((name, self.builtins), (line, self.lines)):
+            stats = table.get(key)
+            if stats is None:
+                stats = table[key] = Stats()
+            stats.calls += 1
+            stats.self_time += self_time
+            self.active[key] -= 1
+            if self.active[key] == 0:
+                stats.total += elapsed
+
+    def report(self, sort: str = "self", limit: int = 20) -> str:
+        """Table of the builtins and source lines taking the most time"""
+        if sort not in self.SORT_KEYS:
+            raise ValueError(f"unknown sort key '{sort}', expected one of {', '.join(self.SORT_KEYS)}")
+
+        def key(item):
+            stats = item[1]
+            return stats.self_time if sort == "self" else stats.total if sort == "total" else stats.calls
+
+        def table(title, rows):
+            lines = [f"{'calls':>10} {'total (ms)':>12} {'self (ms)':>12} {'per call (us)':>14}  {title}"]
+            for name, stats in sorted(rows, key=key, reverse=True)[:limit]:
+                per_call = stats.total / stats.calls * 1e6
+                lines.append(f"{stats.calls:>10} {stats.total * 1000:>12.3f} {stats.self_time * 1000:>12.3f} {per_call:>14.2f}  {name}")
+            return lines
+
+        lines = table("builtin", self.builtins.items())
+        lines.append("")
+        lines += table("line", [(f"{file_path}:{line}", stats) for (file_path, line), stats in self.lines.items()])
+        return "\n".join(lines)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {round(self_time * 1e6)}\n" for stack, self_time in self.stacks.items())
+
+    def write_collapsed(self, path: str):
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+
+
+class ProfilingInterpreter(Interpreter):
+    """
+    Tree walker timing every function call into a Profiler. Builtins like 'for', 'if'
+    and the arithmetic ones run through run_for, run_if... so their time is counted
+    under their name. A plain Interpreter has no profiling code at all.
+    """
+
+    def __init__(self, ast: Program, builtins: BuiltinRegistry = None, output=None, profiler: Profiler = None):
+        super().__init__(ast, builtins, output)
+        self.profiler = Profiler() if profiler is None else profiler
+
+    def evaluate(self, node):
+        if not isinstance(node, FunctionCallNode):
+            return super().evaluate(node)
+
+        self.profiler.enter(node)
+        try:
+            return super().evaluate(node)
+        finally:
+            self.profiler.exit()
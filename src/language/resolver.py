@@ -0,0 +1,98 @@
+from .pparser import *
+
+
+class Unset:
+    """Value of a frame slot whose variable is not defined (yet)"""
+
+    def __repr__(self):
+        return "UNSET"
+
+    def __reduce__(self):
+        # unpickles as the UNSET of this module, it's compared by identity
+        return "UNSET"
+
+UNSET = Unset()
+
+
+class Resolver:
+    """
+    Assigns every identifier a numeric slot in the interpreter's frame,
+    so variables are read and written by index instead of by name.
+    Slots are only ever added, resolving more code keeps the existing ones.
+    """
+
+    def __init__(self):
+        self.slots: dict[str, int] = {}
+        self.names: list[str] = []
+
+    def slot(self, name: str) -> int:
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+    def resolve(self, node: Node) -> Node:
+        """Store the slot of every variable access and assignment under `node` on the nodes"""
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, VarAccessNode):
+                current.slot = self.slot(current.var_name)
+            elif isinstance(current, AssignmentNode):
+                current.slot = self.slot(current.var_name)
+                stack.append(current.expr)
+            elif isinstance(current, (Program, BlockNode)):
+                stack.extend(current.statements)
+            elif isinstance(current, FunctionCallNode):
+                stack.extend(current.args)
+            elif isinstance(current, ListNode):
+                stack.extend(current.values)
+            elif isinstance(current, ElifNode):
+                stack.append(current.cond)
+                stack.append(current.expr)
+        return node
+
+
+def read_slots(node: Node) -> tuple[int, ...]:
+    """Slots of the variables read under `node`, which has to be resolved already"""
+    slots = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, VarAccessNode):
+            if current.slot not in slots:
+                slots.append(current.slot)
+        elif isinstance(current, AssignmentNode):
+            stack.append(current.expr)
+        elif isinstance(current, (Program, BlockNode)):
+            stack.extend(current.statements)
+        elif isinstance(current, FunctionCallNode):
+            stack.extend(current.args)
+        elif isinstance(current, ListNode):
+            stack.extend(current.values)
+        elif isinstance(current, ElifNode):
+            stack.append(current.cond)
+            stack.append(current.expr)
+    return tuple(slots)
+
+
+def nesting_depth(node: Node) -> int:
+    """How many levels of nodes there are under `node`, a leaf is 1"""
+    depth = 0
+    stack = [(node, 1)]
+    while stack:
+        current, level = stack.pop()
+        depth = max(depth, level)
+        if isinstance(current, AssignmentNode):
+            stack.append((current.expr, level + 1))
+        elif isinstance(current, (Program, BlockNode)):
+            stack.extend((child, level + 1) for child in current.statements)
+        elif isinstance(current, FunctionCallNode):
+            stack.extend((child, level + 1) for child in current.args)
+        elif isinstance(current, ListNode):
+            stack.extend((child, level + 1) for child in current.values)
+        elif isinstance(current, ElifNode):
+            stack.append((current.cond, level + 1))
+            stack.append((current.expr, level + 1))
+    return depth
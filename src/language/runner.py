@@ -0,0 +1,204 @@
+import sys
+import time
+
+from .builtins import *
+from .errors import *
+from .inline_cache import cache_stats
+from .interpreter import Interpreter
+from .lexer import Lexer
+from .optimizer import Optimizer
+from .output import *
+from .pparser import *
+
+
+class RunMetrics:
+    """What one run_source call did, times are in seconds"""
+
+    def __init__(self):
+        self.lex_time = 0.0
+        self.parse_time = 0.0
+        self.optimize_time = 0.0
+        self.exec_time = 0.0
+        self.tokens = 0
+        self.nodes = 0
+        # only counted by the tree walker, None with the other engines
+        self.evaluated_nodes = None
+        self.loop_iterations = None
+        # inline caches of the arithmetic and comparison call sites, see InlineCache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # written to stdout, by log and by error messages
+        self.log_bytes = 0
+
+    @property
+    def total_time(self) -> float:
+        return self.lex_time + self.parse_time + self.optimize_time + self.exec_time
+
+    def as_dict(self) -> dict:
+        return {
+            "lex_time": self.lex_time,
+            "parse_time": self.parse_time,
+            "optimize_time": self.optimize_time,
+            "exec_time": self.exec_time,
+            "total_time": self.total_time,
+            "tokens": self.tokens,
+            "nodes": self.nodes,
+            "evaluated_nodes": self.evaluated_nodes,
+            "loop_iterations": self.loop_iterations,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "log_bytes": self.log_bytes,
+        }
+
+    def __repr__(self):
+        return f"RunMetrics({', '.join(f'{key}={value}' for key, value in self.as_dict().items())})"
+
+
+class RunResult:
+    """
+    Outcome of run_source: the value of the last statement and the metrics.
+    A program stopped by an error has the exit code it would have had from main.py
+    and the FclError that stopped it
+    """
+
+    def __init__(self, value, metrics: RunMetrics, exit_code: int = 0, error: FclError = None):
+        self.value = value
+        self.metrics = metrics
+        self.exit_code = exit_code
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+    def __repr__(self):
+        return f"RunResult(value={self.value!r}, exit_code={self.exit_code}, error={self.error!r}, metrics={self.metrics})"
+
+
+class MetricsInterpreter(Interpreter):
+    """Tree walker counting the nodes it evaluates and the iterations of its loops"""
+
+    def __init__(self, ast: Program, builtins: BuiltinRegistry = None, output=None, metrics: RunMetrics = None):
+        super().__init__(ast, builtins, output)
+        self.metrics = RunMetrics() if metrics is None else metrics
+        self.metrics.evaluated_nodes = 0
+        self.metrics.loop_iterations = 0
+
+    def evaluate(self, node):
+        self.metrics.evaluated_nodes += 1
+        return super().evaluate(node)
+
+    def for_range(self, start: int, end: int):
+        metrics = self.metrics
+        for i in range(start, end):
+            metrics.loop_iterations += 1
+            yield i
+
+    def for_values(self, values):
+        metrics = self.metrics
+        for value in values:
+            metrics.loop_iterations += 1
+            yield value
+
+
+class CountingWriter:
+    """Text stream passing everything to `stream` and counting the utf-8 bytes written"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        self.bytes += len(text.encode("utf-8", "surrogateescape"))
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def count_nodes(node: Node) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        count += 1
+        if isinstance(current, (Program, BlockNode)):
+            stack.extend(current.statements)
+        elif isinstance(current, FunctionCallNode):
+            stack.extend(current.args)
+        elif isinstance(current, ListNode):
+            stack.extend(current.values)
+        elif isinstance(current, AssignmentNode):
+            stack.append(current.expr)
+        elif isinstance(current, ElifNode):
+            stack.append(current.cond)
+            stack.append(current.expr)
+    return count
+
+
+def run_source(code: str, file_path: str = "<string>", engine=Interpreter, builtins: BuiltinRegistry = None,
+               optimizer: Optimizer = None, stdout=None, callback=None) -> RunResult:
+    """
+    Lex, parse, optimize (when given an optimizer) and run `code`, timing every phase.
+    `engine` is the interpreter class, the tree walker also counts evaluated nodes and
+    loop iterations. Output goes to `stdout` (sys.stdout by default).
+    Errors don't exit, they end the run with the exit code main.py would have.
+    `callback` is called with the RunResult once the run ends, even on errors.
+    """
+    metrics = RunMetrics()
+    # the run writes to its own stream, sys.stdout is shared by every thread
+    writer = CountingWriter(sys.stdout if stdout is None else stdout)
+    value = None
+    # until the run ends without an exception
+    exit_code = 1
+    error = None
+
+    try:
+        start = time.perf_counter()
+        lexer = Lexer(code, file_path)
+        lexer.tokenize()
+        metrics.tokens = len(lexer.tokens) - 1
+        metrics.lex_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ast = Parser(lexer).parse()
+        metrics.parse_time = time.perf_counter() - start
+        metrics.nodes = count_nodes(ast)
+        del lexer
+
+        if optimizer is not None:
+            start = time.perf_counter()
+            ast = optimizer.optimize(ast)
+            metrics.optimize_time = time.perf_counter() - start
+
+        output = BufferedSink(writer)
+        if engine is Interpreter:
+            interp = MetricsInterpreter(ast, builtins, output, metrics)
+        else:
+            interp = engine(ast, builtins, output)
+
+        start = time.perf_counter()
+        try:
+            value = interp.run()
+        finally:
+            metrics.exec_time = time.perf_counter() - start
+            stats = cache_stats(ast)
+            metrics.cache_hits = stats["hits"]
+            metrics.cache_misses = stats["misses"]
+        exit_code = 0
+    except FclError as e:
+        # printed where main.py prints it, after the output of the program
+        writer.write(e.message + "\n")
+        error = e
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+    finally:
+        # other exceptions still reach the caller, after the callback saw the run fail
+        metrics.log_bytes = writer.bytes
+        result = RunResult(value, metrics, exit_code, error)
+        if callback is not None:
+            callback(result)
+    return result
@@ -0,0 +1,421 @@
+from array import array
+import math
+
+from .pparser import *
+from .resolver import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ListValue:
+    """
+    Runtime value of a list, its elements are evaluated once when the list is created.
+    Lists of only ints or only floats are stored in a NumPy array when NumPy is
+    installed and in an array.array otherwise, anything else in a tuple.
+    Lists can't be changed so literal lists are created once and shared.
+
+    `texts` keeps how number literals were written when that differs from the
+    value ("1.50"), so lists print like their source.
+    """
+    __slots__ = ("data", "texts")
+
+    def __init__(self, data, texts: list | None = None):
+        self.data = data
+        self.texts = texts
+
+    @classmethod
+    def from_values(cls, values: list, texts: list | None = None):
+        return cls(pack(values), texts)
+
+    @classmethod
+    def from_range(cls, start: int, end: int, step: int = 1):
+        try:
+            if numpy is not None:
+                return cls(numpy.arange(start, end, step, dtype=numpy.int64))
+            return cls(array("q", range(start, end, step)))
+        except OverflowError:
+            return cls(tuple(range(start, end, step)))
+
+    @property
+    def typecode(self) -> str | None:
+        """'q' for int lists, 'd' for float lists and None when the elements are mixed"""
+        data = self.data
+        if isinstance(data, array):
+            return data.typecode
+        elif numpy is not None and isinstance(data, numpy.ndarray):
+            return "q" if data.dtype.kind == "i" else "d"
+        return None
+
+    def is_array(self) -> bool:
+        """Stored in a NumPy array, the elements can go through NumPy operations"""
+        return numpy is not None and isinstance(self.data, numpy.ndarray)
+
+    def sum(self):
+        """Sum of the elements, NotImplemented unless they are all numbers"""
+        data = self.data
+        typecode = self.typecode
+        if typecode == "q":
+            if self.is_array() and len(data) * max_abs(data) < INT64_LIMIT:
+                return int(data.sum())
+            return sum(self.tolist())
+        elif typecode == "d":
+            return math.fsum(data)
+
+        if not all(type(value) is int or type(value) is float for value in data):
+            return NotImplemented
+        if all(type(value) is int for value in data):
+            return sum(data)
+        return math.fsum(data)
+
+    def extreme(self, largest: bool):
+        """Smallest or largest element, NotImplemented if the elements can't be compared"""
+        if self.is_array():
+            return (self.data.max() if largest else self.data.min()).item()
+        return extreme(list(self.data), largest)
+
+    def tolist(self) -> list:
+        data = self.data
+        if numpy is not None and isinstance(data, numpy.ndarray):
+            return data.tolist()
+        return list(data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, i: int):
+        try:
+            value = self.data[i]
+        except IndexError:
+            raise IndexError("list index out of range") from None
+        # numpy scalars become python numbers, the engines check for int and float
+        return value.item() if numpy is not None and isinstance(value, numpy.generic) else value
+
+    def __iter__(self):
+        data = self.data
+        if numpy is not None and isinstance(data, numpy.ndarray):
+            # converted one element at a time, a loop that stops early doesn't copy the whole array
+            return map(numpy.generic.item, data)
+        return iter(data)
+
+    def __eq__(self, other):
+        if not isinstance(other, ListValue):
+            return NotImplemented
+        return len(self) == len(other) and all(equal(a, b) for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        texts = self.texts
+        if texts is None:
+            return "[" + ", ".join([format_value(value) for value in self]) + "]"
+        return "[" + ", ".join([format_value(value) if text is None else text for value, text in zip(self, texts)]) + "]"
+
+
+class Sequence:
+    """
+    Lazy sequence of values, `source` returns a new iterator over them every time
+    the sequence is iterated so 'foreach' goes through them without building a list.
+    `name` is how the sequence prints.
+    """
+    __slots__ = ("name", "source")
+
+    def __init__(self, name: str, source):
+        self.name = name
+        self.source = source
+
+    def __iter__(self):
+        return self.source()
+
+    def __repr__(self):
+        return f"<{self.name}>"
+
+
+class Rope:
+    """
+    String built by 'add' or 'concat' out of parts that are only joined once the
+    whole text is needed (log, index, eq...), len doesn't need it.
+    Appending to the newest rope of a parts list appends to that list, so building
+    a string in a loop takes linear time. Older ropes on the same list only see
+    their first `count` parts.
+    """
+    __slots__ = ("parts", "count", "length")
+
+    # strings shorter than this are concatenated right away
+    MIN_LENGTH = 256
+
+    def __init__(self, parts: list, length: int):
+        self.parts = parts
+        self.count = len(parts)
+        self.length = length
+
+    def append(self, text) -> "Rope":
+        """Rope of this text followed by `text`, a str or a Rope"""
+        parts = self.parts
+        if self.count != len(parts):
+            # a longer rope was already built on the parts
+            parts = parts[:self.count]
+        if type(text) is Rope:
+            parts.extend(text.parts[:text.count])
+        else:
+            parts.append(text)
+        return Rope(parts, self.length + len(text))
+
+    def __str__(self):
+        if self.count != 1:
+            text = "".join(self.parts[:self.count])
+            # ropes already built on the old list keep it
+            self.parts = [text]
+            self.count = 1
+        return self.parts[0]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, i: int) -> str:
+        return str(self)[i]
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __eq__(self, other):
+        if not isinstance(other, (str, Rope)):
+            return NotImplemented
+        return self.length == len(other) and str(self) == str(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(str(self))
+
+
+def concat(left, right):
+    """'add' of two strings or ropes, long results are ropes"""
+    if type(left) is Rope:
+        return left.append(right)
+    length = len(left) + len(right)
+    if length < Rope.MIN_LENGTH:
+        return left + str(right)
+    if type(right) is Rope:
+        return Rope([left, *right.parts[:right.count]], length)
+    return Rope([left, right], length)
+
+
+def format_value(value) -> str:
+    """How `value` is printed by 'log' and converted by 'str', bools are written like FCL literals"""
+    if value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    return str(value)
+
+def equal(a, b) -> bool:
+    """'eq' of two values, bools are never equal to numbers like they are in python"""
+    return a == b and (type(a) is bool) is (type(b) is bool)
+
+
+class Thunk:
+    """
+    Value bound by 'var': the expression is evaluated on the first read and the
+    value is kept along with the values of the variables it read (`inputs`) and the
+    `version` of the ones that are thunks too. Reads only evaluate it again when one
+    of those variables changed, see Interpreter.force.
+    """
+    __slots__ = ("node", "slots", "value", "inputs", "versions", "version", "checking", "forcing")
+
+    def __init__(self, node: Node, slots: tuple[int, ...]):
+        self.node = node
+        self.slots = slots
+        self.value = UNSET
+        self.inputs = None
+        self.versions = None
+        # counts the evaluations, a var reading this one is stale once it changes
+        self.version = 0
+        # set while current() runs, a var reading itself isn't current
+        self.checking = False
+        # set while the expression is evaluated, see Interpreter.force
+        self.forcing = False
+
+    def current(self, frame: list) -> bool:
+        """
+        The kept value is still the value of the expression. The vars it read are
+        checked with an explicit stack, long chains of them would hit the recursion limit
+        """
+        if self.value is UNSET or self.checking:
+            return False
+        self.checking = True
+        # thunks being checked (each with the inputs left to check) and those found current
+        path = [self]
+        inputs = [zip(self.slots, self.inputs, self.versions)]
+        checked = set()
+        try:
+            while path:
+                for slot, seen, version in inputs[-1]:
+                    value = frame[slot]
+                    if value is not seen:
+                        return False
+                    if type(value) is not Thunk:
+                        continue
+                    if value.version != version:
+                        return False
+                    if value not in checked:
+                        if value.value is UNSET or value.checking:
+                            return False
+                        value.checking = True
+                        path.append(value)
+                        inputs.append(zip(value.slots, value.inputs, value.versions))
+                        break
+                else:
+                    thunk = path.pop()
+                    thunk.checking = False
+                    checked.add(thunk)
+                    inputs.pop()
+            return True
+        finally:
+            for thunk in path:
+                thunk.checking = False
+
+    def __str__(self):
+        # the value of a 'var' call, printed as its expression like before bindings were thunks
+        return str(self.node)
+
+    def __repr__(self):
+        return f"Thunk({self.node!r})"
+
+
+def pack(values: list):
+    """Most compact storage for `values`"""
+    if values:
+        first = type(values[0])
+        if (first is int or first is float) and all(type(value) is first for value in values):
+            try:
+                if numpy is not None:
+                    return numpy.array(values, dtype=numpy.int64 if first is int else numpy.float64)
+                return array("q" if first is int else "d", values)
+            except OverflowError:
+                # ints over 64 bits
+                pass
+    return tuple(values)
+
+
+def extreme(values: list, largest: bool):
+    """Smallest or largest of numbers or of strings, NotImplemented for anything else"""
+    values = [str(value) if type(value) is Rope else value for value in values]
+    if all(type(value) is int or type(value) is float for value in values) or all(type(value) is str for value in values):
+        return max(values) if largest else min(values)
+    return NotImplemented
+
+
+# element wise operations on lists stored in NumPy arrays
+
+INT64_LIMIT = 1 << 63
+# floats hold every int up to this one exactly
+FLOAT_EXACT_LIMIT = 1 << 53
+
+if numpy is not None:
+    NUMPY_ARITH = {
+        "add": numpy.add,
+        "sub": numpy.subtract,
+        "mul": numpy.multiply,
+        "div": numpy.true_divide,
+        "mod": numpy.mod,
+    }
+    NUMPY_COMPARE = {
+        "eq": numpy.equal,
+        "neq": numpy.not_equal,
+        "gt": numpy.greater,
+        "gte": numpy.greater_equal,
+        "lt": numpy.less,
+        "lte": numpy.less_equal,
+    }
+
+def max_abs(data) -> int:
+    return int(numpy.abs(data).max()) if len(data) else 0
+
+def numpy_operand(value):
+    """NumPy array or number to use for `value`, None when it can't go through NumPy"""
+    if isinstance(value, ListValue):
+        return value.data if value.is_array() else None
+    elif type(value) is int:
+        return value if -INT64_LIMIT < value < INT64_LIMIT else None
+    elif type(value) is float:
+        return value
+    return None
+
+def numpy_arithmetic(func_name: str, val1, val2) -> ListValue | None:
+    """
+    `func_name` of a list and a number or two lists of the same length with NumPy,
+    None whenever the result could be different from doing it one element at a time
+    (int overflow, division by zero, pow) so the caller does that instead
+    """
+    if numpy is None or func_name not in NUMPY_ARITH:
+        return None
+    a = numpy_operand(val1)
+    b = numpy_operand(val2)
+    if a is None or b is None:
+        return None
+
+    is_int = lambda x: type(x) is int or (isinstance(x, numpy.ndarray) and x.dtype.kind == "i")
+    bound = lambda x: abs(x) if type(x) is int else max_abs(x)
+    if is_int(a) and is_int(b):
+        if func_name in ("add", "sub") and bound(a) + bound(b) >= INT64_LIMIT:
+            return None
+        elif func_name == "mul" and bound(a) * bound(b) >= INT64_LIMIT:
+            return None
+        elif func_name == "div" and max(bound(a), bound(b)) > FLOAT_EXACT_LIMIT:
+            return None
+
+    if func_name in ("div", "mod") and numpy.any(numpy.asarray(b) == 0):
+        return None
+    return ListValue(NUMPY_ARITH[func_name](a, b))
+
+def numpy_comparison(func_name: str, val1, val2):
+    """Comparison of numeric lists as a NumPy bool array, None when it can't be done with NumPy"""
+    if numpy is None:
+        return None
+    a = numpy_operand(val1)
+    b = numpy_operand(val2)
+    if a is None or b is None:
+        return None
+    # 'gt' and friends only take ints and ints compare exactly with floats in python
+    kinds = {"i" if type(x) is int else "f" if type(x) is float else x.dtype.kind for x in (a, b)}
+    if len(kinds) != 1 or (func_name not in ("eq", "neq") and kinds != {"i"}):
+        return None
+    return NUMPY_COMPARE[func_name](a, b)
+
+
+def list_texts(nodes: list[Node]) -> list | None:
+    """How the number literals among `nodes` are written, None if they all print like their value"""
+    texts = None
+    for i, node in enumerate(nodes):
+        if isinstance(node, NumberNode):
+            text = node.value
+        elif isinstance(node, ConstNode) and node.text is not None:
+            text = node.text
+        else:
+            continue
+        try:
+            value = node.value if isinstance(node, ConstNode) else float(text) if "." in text else int(text)
+        except ValueError:
+            continue
+        if str(value) != text:
+            if texts is None:
+                texts = [None] * len(nodes)
+            texts[i] = text
+    return texts
+
+
+def value_type(value) -> type:
+    """Type of `value` shown in error messages, lists show up as python lists like they always did and ropes as str"""
+    if isinstance(value, ListValue):
+        return list
+    return str if isinstance(value, Rope) else type(value)
+
+
+def is_literal(node: Node) -> bool:
+    """Nodes whose value never changes, lists made only of them are created once"""
+    if isinstance(node, (StringNode, NumberNode, ConstNode, BoolNode)):
+        return True
+    return isinstance(node, ListNode) and node.constant is not None
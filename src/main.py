@@ -1,27 +1,129 @@
 from language import *
+import argparse
 import sys
 import time
 
+ENGINES = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VM,
+}
+
 def main():
-    args = sys.argv[1:]
-    if len(args) == 0:
-        print("Usage: python main.py <filename>")
-        exit(1)
-    
-    file_name = args[0]
-    code = open(file_name, "r").read()
+    arg_parser = argparse.ArgumentParser(prog="main.py", description="Run an FCL program.")
+    arg_parser.add_argument("filename")
+    arg_parser.add_argument("--engine", choices=ENGINES.keys(), default="tree",
+                            help="execution engine, 'closure' compiles the program into python closures, 'vm' into bytecode")
+    arg_parser.add_argument("--dis", action="store_true", help="print the program's bytecode instead of running it")
+    arg_parser.add_argument("-O", "--optimize", action="store_true", help="run the optimizer passes before running the program")
+    arg_parser.add_argument("--passes", default=",".join(Optimizer.PASSES),
+                            help=f"comma separated optimizer passes to run with -O (default: {','.join(Optimizer.PASSES)})")
+    arg_parser.add_argument("--opt-report", action="store_true", help="print what every optimizer pass changed to stderr")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="lex the file from a memory map and run every top level statement as soon as it is parsed")
+    arg_parser.add_argument("--no-cache", action="store_true", help="always lex and parse the file, don't read or write the .fclc cache")
+    arg_parser.add_argument("--cache-dir", help="directory of the .fclc cache (default: __fclcache__ next to the file)")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="time every builtin and source line and print the hot spots to stderr (runs the tree walker)")
+    arg_parser.add_argument("--profile-sort", choices=Profiler.SORT_KEYS, default="self", help="column the profile is sorted by")
+    arg_parser.add_argument("--profile-stacks", metavar="FILE",
+                            help="where --profile writes the collapsed stacks for flamegraph tools (default: <filename>.collapsed)")
+    arg_parser.add_argument("--buffer-size", type=int, default=BufferedSink.BUFFER_SIZE,
+                            help=f"characters of log output buffered before writing them, 0 writes every line (default: {BufferedSink.BUFFER_SIZE})")
+    arg_parser.add_argument("--ic-stats", action="store_true",
+                            help="print the hits and misses of the arithmetic and comparison inline caches to stderr")
+    arg_parser.add_argument("--pfor-workers", type=int, help="processes running 'pfor' loops (default: one per cpu)")
+    args = arg_parser.parse_args()
+
+    if args.stream and args.dis:
+        arg_parser.error("--dis needs the whole program, it can't be used with --stream")
+    if args.stream and args.ic_stats:
+        arg_parser.error("--ic-stats needs the whole program, it can't be used with --stream")
+    if args.profile and args.engine != "tree":
+        arg_parser.error("--profile only works with the tree walker engine")
+
+    optimizer = None
+    passes = ()
+    if args.optimize:
+        passes = [name.strip() for name in args.passes.split(",") if name.strip()]
+        try:
+            optimizer = Optimizer(passes)
+        except ValueError as e:
+            arg_parser.error(str(e))
+        passes = optimizer.passes
+
+    if args.pfor_workers is not None:
+        if args.pfor_workers < 1:
+            arg_parser.error("--pfor-workers must be at least 1")
+        Interpreter.pfor_workers = args.pfor_workers
+
+    file_name = args.filename
+
+    output = BufferedSink(buffer_size=args.buffer_size)
+    engine = lambda ast: ENGINES[args.engine](ast, output=output)
+    profiler = None
+    if args.profile:
+        profiler = Profiler()
+        engine = lambda ast: ProfilingInterpreter(ast, output=output, profiler=profiler)
 
     start = time.perf_counter()
-    lexer = Lexer(code, file_name)
-    lexer.tokenize()
-    parser = Parser(lexer)
-    ast = parser.parse()
-    interp = Interpreter(ast)
-    _ = interp.run()
+    try:
+        interp = run(args, file_name, engine, optimizer, passes)
+    except FclError as e:
+        # the program's output was flushed when it stopped
+        print(e.message)
+        sys.exit(1)
+    finally:
+        if profiler is not None:
+            print(profiler.report(args.profile_sort), file=sys.stderr)
+            profiler.write_collapsed(args.profile_stacks or f"{file_name}.collapsed")
+
+    if optimizer is not None and args.opt_report:
+        print(optimizer.report(), file=sys.stderr)
+    if args.ic_stats and interp is not None:
+        stats = interp.inline_cache_stats()
+        print(", ".join(f"{key}: {value}" for key, value in stats.items()), file=sys.stderr)
     end = time.perf_counter() - start
     # print()
     # print(end, "time")
     # print(last_expression)
 
+def run(args, file_name: str, engine, optimizer: Optimizer | None, passes):
+    if args.stream:
+        parser = Parser(StreamLexer(file_name))
+        parser.start()
+        statements = parser.statements()
+        if optimizer is not None:
+            statements = (optimizer.optimize(stat) for stat in statements)
+        interp = engine(Program(parser.current_token))
+        _ = interp.run_stream(statements)
+        return interp
+    else:
+        code = open(file_name, "r").read()
+        cache = None
+        if not args.no_cache:
+            cache = AstCache(args.cache_dir or AstCache.default_directory(file_name))
+
+        # the report needs the passes to run
+        ast = None
+        if cache is not None and not args.opt_report:
+            ast = cache.load(file_name, code, passes)
+
+        if ast is None:
+            lexer = Lexer(code, file_name)
+            lexer.tokenize()
+            parser = Parser(lexer)
+            ast = parser.parse()
+            if optimizer is not None:
+                ast = optimizer.optimize(ast)
+            if cache is not None:
+                cache.store(file_name, code, ast, passes)
+        if args.dis:
+            print(disassemble(BytecodeCompiler().compile(ast)))
+            return
+        interp = engine(ast)
+        _ = interp.run()
+        return interp
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,23 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from language import *
+
+ENGINES = [Interpreter, ClosureInterpreter, VM]
+
+
+@pytest.fixture
+def fcl():
+    """Runs FCL code with run_source and returns (result, printed output)"""
+
+    def run(code: str, engine=Interpreter, optimizer: Optimizer = None, file_path: str = "<test>"):
+        stdout = io.StringIO()
+        result = run_source(code, file_path, engine, optimizer=optimizer, stdout=stdout)
+        return result, stdout.getvalue()
+
+    return run
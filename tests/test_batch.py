@@ -0,0 +1,44 @@
+from language import *
+
+
+def write(directory, files: dict[str, str]):
+    for name, code in files.items():
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(code)
+
+
+def test_collect_files(tmp_path):
+    write(tmp_path, {"b.fcl": "", "a.fcl": "", "sub/c.fcl": "", "notes.txt": "", "__fclcache__/d.fcl": ""})
+    assert collect_files([str(tmp_path), "x.fcl"]) == [
+        str(tmp_path / "a.fcl"), str(tmp_path / "b.fcl"), str(tmp_path / "sub" / "c.fcl"), "x.fcl",
+    ]
+
+
+def test_run_batch(tmp_path):
+    write(tmp_path, {
+        "1_ok.fcl": "for(i, 0, 3, log(i))\n",
+        "2_error.fcl": "log(\"before\")\nlog(nope)\n",
+        "3_input.fcl": "log(input(\"name? \"))\n",
+        "4_ok.fcl": "log(add(\"a\", \"b\"))\n",
+    })
+    seen = []
+    report = run_batch([str(tmp_path), str(tmp_path / "missing.fcl")], VM, ["fold"], workers=2, callback=seen.append)
+
+    results = report.results
+    assert seen == results
+    assert [result.path for result in results] == [str(tmp_path / f"{name}.fcl") for name in ("1_ok", "2_error", "3_input", "4_ok", "missing")]
+    assert [result.exit_code for result in results] == [0, 1, 1, 0, 1]
+    assert results[0].stdout == "0\n1\n2\n"
+    assert results[1].stdout.startswith("before\nVariable 'nope' does not exists")
+    # stdin is empty in the workers
+    assert "'input' function reached the end of the input" in results[2].stdout
+    assert results[3].stdout == "ab\n"
+    assert results[4].metrics is None and results[4].error.startswith("FileNotFoundError")
+
+    assert report.failed == [results[1], results[2], results[4]]
+    totals = report.as_dict()
+    assert totals["files"] == 5 and totals["failed"] == 3 and totals["workers"] == 2
+    summary = report.summary()
+    assert "5 files, 3 failed, 2 workers" in summary
+    assert "exit 1" in summary and str(tmp_path / "4_ok.fcl") in summary
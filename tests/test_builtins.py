@@ -0,0 +1,53 @@
+import io
+
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+
+def parse(code: str) -> Program:
+    lexer = Lexer(code, "<test>")
+    lexer.tokenize()
+    return Parser(lexer).parse()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_custom_builtin(fcl, engine):
+    registry = BUILTINS.copy()
+    registry.register("double", lambda interp, args, node: args[0] * 2, arity=1)
+    output = io.StringIO()
+    engine(parse("log(double(21))\n"), registry, output).run()
+    assert output.getvalue() == "42\n"
+
+
+def test_ast_run_with_other_registries():
+    ast = parse("log(double(21))\n")
+    doubling = BUILTINS.copy()
+    doubling.register("double", lambda interp, args, node: args[0] * 2, arity=1)
+    logging = doubling.copy()
+    logging.register("log", lambda interp, args, node: interp.output.write(f"logged {args}\n"))
+
+    outputs = [io.StringIO() for _ in range(2)]
+    Interpreter(ast, doubling, outputs[0]).run()
+    Interpreter(ast, logging, outputs[1]).run()
+    assert [output.getvalue() for output in outputs] == ["42\n", "logged [42]\n"]
+
+    with pytest.raises(FclRuntimeError, match="function 'double' does not exist"):
+        Interpreter(ast, output=io.StringIO()).run()
+
+
+def test_list_iteration_gives_python_numbers():
+    for values in ([1, 2, 3], [1.5, 2.0], [1, "a", 2.5]):
+        assert [(type(value), value) for value in ListValue.from_values(values)] == \
+            [(type(value), value) for value in values]
+    numbers = iter(ListValue.from_range(0, 10 ** 7))
+    assert [next(numbers) for _ in range(3)] == [0, 1, 2]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_foreach_and_filter(fcl, engine):
+    code = "xs = range(0, 6)\nforeach(x, xs, log(x))\nlog(filter(xs, eq(mod(xs, 2), 0)))\n"
+    result, out = fcl(code, engine)
+    assert result.ok, result.error
+    assert out == "0\n1\n2\n3\n4\n5\n[0, 2, 4]\n"
@@ -0,0 +1,28 @@
+import io
+import os
+
+import pytest
+
+from language import *
+
+
+def parse(code: str, file_path: str) -> Program:
+    lexer = Lexer(code, file_path)
+    lexer.tokenize()
+    return Parser(lexer).parse()
+
+
+def test_load_from_another_path(tmp_path, monkeypatch):
+    code = "log(1)\nlog(div(1, 0))\n"
+    (tmp_path / "e.fcl").write_text(code)
+    monkeypatch.chdir(tmp_path)
+    cache = AstCache(str(tmp_path / "__fclcache__"))
+    assert cache.store("e.fcl", code, parse(code, "e.fcl"))
+
+    file_path = os.path.join(str(tmp_path), "e.fcl")
+    ast = cache.load(file_path, code)
+    assert ast is not None
+    with pytest.raises(FclRuntimeError) as error:
+        Interpreter(ast, output=io.StringIO()).run()
+    assert error.value.loc.file_path == file_path
+    assert error.value.loc.line == 2
@@ -0,0 +1,71 @@
+import io
+
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+PROGRAMS = {
+    "arithmetic": "x = 10\ny = div(x, 4)\nlog(y, mul(y, 2), sub(x, 3), pow(2, 10), mod(17, 5), add(\"ab\", \"cd\"))\n",
+    "literals": "a = [1, 2, \"three\", 4.5, 1.50, true]\nlog(a, len(a), index(a, 2), index(a, sub(0, 1)), str(12), 1.25)\n",
+    "branches": "log(if(true, 5), if(false, 1, 2), if(false, 1, elif(false, 2), elif(1, 3), 4))\n"
+                "if(false, log(\"no\"), elif(false, log(\"no2\")), log(\"else\"))\n",
+    "logic": "log(and(1, 2, 3), or(0, 0, 0), and(false, log(\"no\")), or(true, log(\"no\")))\n"
+             "x = 0\nlog(and(neq(x, 0), gt(div(10, x), 1)))\n",
+    "loops": "n = 1\nfor(i, 0, 5, n = add(n, i))\nlog(n, for(j, 0, 2, j))\n"
+             "for(i, 0, 2, for(j, 0, 2, log(i, j)))\nforeach(c, \"ab\", log(c))\n",
+    "fizzbuzz": "for(i, 1, 16, if(and(eq(mod(i, 3), 0), eq(mod(i, 5), 0)), log(\"FizzBuzz\"), "
+                "elif(eq(mod(i, 3), 0), log(\"Fizz\")), elif(eq(mod(i, 5), 0), log(\"Buzz\")), log(i)))\n",
+    "var": "x = 1\nvar(y, add(x, 1))\nlog(y)\nx = 5\nlog(y, var(k, 7), k)\n",
+    "blocks": "z = (1, 2, add(3, 4))\nlog(z, ())\n",
+}
+
+ERRORS = {
+    "undefined variable": "log(nope)\n",
+    "unknown function": "nope(1)\n",
+    "division by zero": "x = 0\nlog(div(1, x))\n",
+    "index out of range": "log(index([1, 2], 5))\n",
+    "wrong argument type": "log(add(1, \"a\"))\n",
+}
+
+
+@pytest.mark.parametrize("optimizer", [None, Optimizer()], ids=["plain", "optimized"])
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_engines_agree(fcl, name, optimizer):
+    expected, expected_out = fcl(PROGRAMS[name])
+    assert expected.ok, expected.error
+    for engine in ENGINES:
+        result, out = fcl(PROGRAMS[name], engine, optimizer)
+        assert result.ok, (engine, result.error)
+        assert out == expected_out, engine
+
+
+def test_outputs(fcl):
+    assert fcl(PROGRAMS["arithmetic"])[1] == "2.5 5.0 7 1024 2 abcd\n"
+    assert fcl(PROGRAMS["var"])[1] == "2\n6 7 7\n"
+    assert fcl(PROGRAMS["fizzbuzz"])[1].split("\n")[:5] == ["1", "2", "Fizz", "4", "Buzz"]
+
+
+@pytest.mark.parametrize("name", ERRORS)
+def test_engines_raise_the_same_errors(fcl, name):
+    expected, _ = fcl(ERRORS[name])
+    assert isinstance(expected.error, FclRuntimeError)
+    for engine in ENGINES[1:]:
+        result, _ = fcl(ERRORS[name], engine)
+        assert type(result.error) is type(expected.error), engine
+        assert result.error.message == expected.error.message, engine
+
+
+def test_disassemble():
+    lexer = Lexer("x = add(1, 2)\nlog(x)\n", "<test>")
+    lexer.tokenize()
+    listing = disassemble(BytecodeCompiler().compile(Parser(lexer).parse()))
+    assert "ARITH" in listing and "LOG" in listing
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_deep_statements_fall_back(fcl, engine):
+    code = "log(" + "add(1, " * 300 + "0" + ")" * 300 + ")\n"
+    result, out = fcl(code, engine)
+    assert result.ok, result.error
+    assert out == "300\n"
@@ -0,0 +1,71 @@
+import io
+
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code, expected", [
+    ("log(index([1, 2, 3], 2), index([1, 2, 3], sub(0, 1)), index(\"abc\", sub(0, 3)))\n", "3 3 a\n"),
+])
+def test_index(fcl, engine, code, expected):
+    result, out = fcl(code, engine)
+    assert result.ok, result.error
+    assert out == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code", [
+    "log(index([1, 2, 3], 3))\n",
+    "log(index([1, 2, 3], sub(0, 4)))\n",
+    "log(index(\"abc\", 3))\n",
+    "log(index(\"\", 0))\n",
+])
+def test_index_out_of_bounds(fcl, engine, code):
+    result, out = fcl(code, engine)
+    assert isinstance(result.error, FclRuntimeError)
+    assert out.startswith("index out of bounds.")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code", [
+    "log(mod(7, 0))\n",
+    "log(mod(7.5, 0.0))\n",
+    # the second call runs on the inline cache specialized by the first one
+    "for(i, 0, 3, log(mod(7, sub(2, i))))\n",
+    "log(mod([1, 2], 0))\n",
+])
+def test_mod_by_zero(fcl, engine, code):
+    for optimizer in (None, Optimizer()):
+        result, out = fcl(code, engine, optimizer)
+        assert isinstance(result.error, FclRuntimeError)
+        assert "cannot divide by zero" in out
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code, message", [
+    ("log(pow(2.5, 10000))\n", "'pow' function's result is too large for a float"),
+    ("log(div(pow(10, 400), 3))\n", "'div' function's result is too large for a float"),
+    ("log(mul([1.5, 2.5], pow(10, 400)))\n", "'mul' function's result is too large for a float"),
+    ("log(sum([pow(10, 400), 0.5]))\n", "'sum' function's result is too large for a float"),
+    ("log(pow(0, sub(0, 1)))\n", "cannot divide by zero"),
+    # the second call runs on the inline cache specialized by the first one
+    ("for(i, 0, 3, log(pow(2.5, mul(i, 5000))))\n", "'pow' function's result is too large for a float"),
+    ("log(str(pow(10, 5000)))\n", "number has too many digits to convert to a string"),
+    ("log([pow(10, 5000)])\n", "number has too many digits to convert to a string"),
+])
+def test_python_errors_are_fcl_errors(fcl, engine, code, message):
+    for optimizer in (None, Optimizer()):
+        result, out = fcl(code, engine, optimizer)
+        assert isinstance(result.error, FclRuntimeError)
+        assert message in out
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_input_at_end_of_input(fcl, engine, monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO(""))
+    result, out = fcl("log(input(\"> \"))\n", engine)
+    assert isinstance(result.error, FclRuntimeError)
+    assert "'input' function reached the end of the input" in out
@@ -0,0 +1,99 @@
+import io
+
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+CODE = """# a comment
+name = "FCL"  # trailing comment
+log(name, 'two\nlines', 12, 1.50, true, [ä, b_2])
+(add(1, 2))
+"""
+
+
+def tokens(lexer: Lexer) -> list[tuple]:
+    return [(tok.tt, tok.value, repr(tok.start_loc)) for tok in lexer.iter_tokens()]
+
+
+def lex(code: str) -> list[tuple]:
+    lexer = Lexer(code, "<test>")
+    lexer.tokenize()
+    return tokens(lexer)
+
+
+def test_tokens():
+    found = lex(CODE)
+    assert found[:6] == [
+        (Type.Identifier, "name", "<test>:2:1"),
+        (Type.Equal, "=", "<test>:2:6"),
+        (Type.String, "FCL", "<test>:2:8"),
+        (Type.Identifier, "log", "<test>:3:1"),
+        (Type.LeftParen, "(", "<test>:3:4"),
+        (Type.Identifier, "name", "<test>:3:5"),
+    ]
+    values = [value for _, value, _ in found]
+    for value in ("two\nlines", "12", "1.50", "true", "ä", "b_2"):
+        assert value in values
+    assert found[-1][0] == Type.Eof
+    # the string before it spans two lines
+    number = values.index("12")
+    assert found[number:number + 2] == [(Type.Number, "12", "<test>:4:9"), (Type.Comma, ",", "<test>:4:11")]
+
+
+@pytest.mark.parametrize("code, message", [
+    ("x = 1\nlog(\"abc)\n", "at line 2"),
+    ("x = 1\nlog(x) $\n", "<test>:2:8"),
+])
+def test_lex_errors(code, message):
+    with pytest.raises(LexError, match=message):
+        lex(code)
+
+
+def test_slots():
+    lexer = Lexer("x = add(1, 2)\n", "<test>")
+    lexer.tokenize()
+    ast = Parser(lexer).parse()
+    for obj in (lexer.tokens[0], lexer.tokens[0].start_loc, ast.statements[0], ast.statements[0].expr):
+        assert not hasattr(obj, "__dict__"), type(obj)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 20])
+def test_stream_lexer_matches_lexer(tmp_path, chunk_size):
+    path = tmp_path / "code.fcl"
+    code = CODE * 3 + "log(\"ü\")"
+    path.write_text(code, encoding="utf-8")
+    expected = Lexer(code, str(path))
+    expected.tokenize()
+    assert tokens(StreamLexer(str(path), chunk_size)) == tokens(expected)
+
+
+def test_stream_lexer_empty_file(tmp_path):
+    path = tmp_path / "empty.fcl"
+    path.write_text("")
+    assert [tok.tt for tok in StreamLexer(str(path)).iter_tokens()] == [Type.Eof]
+
+
+def run_stream(path: str, engine, chunk_size: int) -> str:
+    parser = Parser(StreamLexer(path, chunk_size))
+    parser.start()
+    output = io.StringIO()
+    engine(Program(parser.current_token), output=output).run_stream(parser.statements())
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_streaming_runs_like_a_whole_program(fcl, tmp_path, engine):
+    code = "x = 0\nfor(i, 0, 4, x = add(x, i))\nvar(y, mul(x, 2))\nlog(x, y)\nx = 1\nlog(y, \"é\")\n"
+    path = tmp_path / "code.fcl"
+    path.write_text(code, encoding="utf-8")
+    expected = fcl(code, engine)[1]
+    assert expected == "6 12\n2 é\n"
+    assert run_stream(str(path), engine, 5) == expected
+
+
+def test_streaming_errors_keep_their_location(tmp_path):
+    path = tmp_path / "code.fcl"
+    path.write_text("log(1)\n" * 20 + "log(nope)\n")
+    with pytest.raises(FclRuntimeError, match=f"{path}:21:5"):
+        run_stream(str(path), Interpreter, 16)
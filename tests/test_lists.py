@@ -0,0 +1,48 @@
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+CASES = [
+    ("nums", "[0, 1, 2, 3, 4, 5, 6, 7, 8, 9]"),
+    ("range(2, 5), range(10, 0, sub(0, 3)), range(0)", "[2, 3, 4] [10, 7, 4, 1] []"),
+    ("len(nums), index(nums, 2), sum(nums), min(nums), max(nums)", "10 2 45 0 9"),
+    ("max(3, 7, 5), min([2.5, 1]), sum([1.5, 2, 0.5])", "7 1 4.0"),
+    ("mul(nums, 2)", "[0, 2, 4, 6, 8, 10, 12, 14, 16, 18]"),
+    ("add(nums, nums), sub(10, range(3))", "[0, 2, 4, 6, 8, 10, 12, 14, 16, 18] [10, 9, 8]"),
+    ("div(range(1, 4), 2), mod(range(5), 3), pow(range(1, 4), 2)", "[0.5, 1.0, 1.5] [0, 1, 2, 0, 1] [1, 4, 9]"),
+    ("add([1.5, 2.5], [1, 2])", "[2.5, 4.5]"),
+    ("filter(nums, gt(nums, 4)), eq(range(3), [0, 5, 2]), lt([1, 2], 2)", "[5, 6, 7, 8, 9] [true, false, true] [true, false]"),
+    ("add([\"a\", \"b\"], \"c\"), add([1, [2, 3]], 1)", "[ac, bc] [2, [3, 4]]"),
+    # past the 64 bit integers of the arrays
+    ("mul(range(1, 3), 9223372036854775807), sum([9223372036854775807, 1])",
+     "[9223372036854775807, 18446744073709551614] 9223372036854775808"),
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("args, expected", CASES)
+def test_lists(fcl, engine, args, expected):
+    result, out = fcl(f"nums = range(10)\nlog({args})\n", engine)
+    assert result.ok, result.error
+    assert out == expected + "\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code, message", [
+    ("add([1, 2], [1, 2, 3])", "'add' function takes lists of the same length, the lengths were 2 and 3"),
+    ("div(range(3), range(3))", "cannot divide by zero"),
+    ("mod([1, 2], 0)", "cannot divide by zero"),
+    ("range(0, 5, 0)", "'range' function's step can't be 0"),
+    ("filter([1, 2], [true])", "'filter' function takes lists of the same length"),
+])
+def test_list_errors(fcl, engine, code, message):
+    result, _ = fcl(f"log({code})\n", engine)
+    assert isinstance(result.error, FclRuntimeError)
+    assert message in result.error.message
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_list_results_are_lists(fcl, engine):
+    code = "xs = mul(range(4), 2)\nlog(index(xs, 3), len(filter(xs, gte(xs, 2))), sum(add(xs, 0.5)))\n"
+    assert fcl(code, engine)[1] == "6 3 14.0\n"
@@ -0,0 +1,56 @@
+import io
+
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+DEPTH = 500
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("code, expected", [
+    ("log(" + "if(false, 0, " * DEPTH + "1" + ")" * DEPTH + ")\n", "1\n"),
+    ("log(" + "if(false, 0, elif(true, " * DEPTH + "1" + "))" * DEPTH + ")\n", "1\n"),
+    ("log(" + "and(true, " * DEPTH + "true" + ")" * DEPTH + ")\n", "true\n"),
+    ("log(" + "or(false, " * DEPTH + "false" + ")" * DEPTH + ")\n", "false\n"),
+], ids=["if", "elif", "and", "or"])
+def test_deep_conditionals(fcl, engine, code, expected):
+    result, out = fcl(code, engine)
+    assert result.ok, result.error
+    assert out == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_deep_for(fcl, engine):
+    code = "x = 1\n" + "".join(f"for(i{k}, 0, 1, " for k in range(DEPTH)) + "log(1)" + ")" * DEPTH + "\n"
+    result, out = fcl(code, engine)
+    assert isinstance(result.error, FclRuntimeError)
+    assert result.error.loc.line == 2
+    assert out.startswith("Code nested too deeply")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_long_var_chain(fcl, engine):
+    # each var is forced by the read after it, the last read only checks the chain
+    code = "v0 = 1\n" + "".join(f"var(v{k + 1}, add(v{k}, 1))\nt = v{k + 1}\n" for k in range(1500)) + "log(v1500)\n"
+    result, out = fcl(code, engine)
+    assert result.ok, result.error
+    assert out == "1501\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_long_unforced_var_chain(fcl, engine):
+    code = "v0 = 1\n" + "".join(f"var(v{k + 1}, add(v{k}, 1))\n" for k in range(DEPTH)) + f"log(v{DEPTH})\n"
+    result, out = fcl(code, engine)
+    assert isinstance(result.error, FclRuntimeError)
+    assert out.startswith("Code nested too deeply")
+
+
+def test_depth_after_error():
+    lexer = Lexer("log(add(1, " * 50 + "div(1, 0)" + "))" * 50, "<test>")
+    lexer.tokenize()
+    interp = Interpreter(Parser(lexer).parse(), output=io.StringIO())
+    with pytest.raises(FclRuntimeError):
+        interp.run()
+    assert interp.depth == 0
@@ -0,0 +1,45 @@
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fold_big_int(fcl, engine):
+    code = "x = pow(10, 5000)\nlog(gt(x, 1), [add(1, 2), 1.50])\n"
+    result, out = fcl(code, engine, Optimizer())
+    assert result.ok, result.error
+    assert out == fcl(code, engine)[1] == "true [3, 1.50]\n"
+
+
+def test_fold_skips_dead_and_huge_results():
+    optimizer = Optimizer()
+    code = "if(false, log(pow(7, 30000000)), log(\"ok\"))\nx = mul(pow(7, 30000000), 2)\nlog(add(2, 3))\n" \
+        "if(eq(1, 2), log(1), log(2))\n"
+    lexer = Lexer(code, "<test>")
+    lexer.tokenize()
+    program = optimizer.optimize(Parser(lexer).parse())
+    # the dead branch is dropped before folding, the big pow is left for runtime
+    assert isinstance(program.statements[0].args[0], StringNode)
+    assert program.statements[1].expr.func_name == "mul"
+    assert isinstance(program.statements[2].args[0], ConstNode)
+    # the condition folded to false is pruned by the second branches run
+    assert program.statements[3].func_name == "log"
+    assert optimizer.changes["branches"] == 2
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("optimizer", [None, Optimizer()])
+def test_bools(fcl, engine, optimizer):
+    code = "t = true\nlog(t, false, str(eq(1, 1)), str(false), and(t, false), or(false, t))\n"
+    result, out = fcl(code, engine, optimizer)
+    assert result.ok, result.error
+    assert out == "true false true false false true\n"
+
+
+def test_bool_literals_are_parsed_once():
+    lexer = Lexer("log(true, false)\n", "<test>")
+    lexer.tokenize()
+    args = Parser(lexer).parse().statements[0].args
+    assert [arg.value for arg in args] == [True, False]
+    assert [repr(arg) for arg in args] == ["true", "false"]
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+
+class Stream(io.StringIO):
+    """Counts the writes reaching it"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        return super().write(text)
+
+
+def test_buffered_sink():
+    stream = Stream()
+    sink = BufferedSink(stream, buffer_size=10)
+    sink.write("12345\n")
+    assert stream.getvalue() == ""
+    sink.write("6789\n")
+    assert stream.getvalue() == "12345\n6789\n" and stream.writes == 1
+    sink.write("x\n")
+    sink.flush()
+    sink.flush()
+    assert stream.getvalue() == "12345\n6789\nx\n" and stream.writes == 2
+
+
+def test_unbuffered_sink():
+    stream = Stream()
+    sink = BufferedSink(stream, buffer_size=0)
+    sink.write("a\n")
+    sink.write("b\n")
+    assert stream.getvalue() == "a\nb\n" and stream.writes == 2
+
+
+def parse(code: str) -> Program:
+    lexer = Lexer(code, "<test>")
+    lexer.tokenize()
+    return Parser(lexer).parse()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_logs_are_written_once_at_the_end(engine):
+    stream = Stream()
+    engine(parse("for(i, 0, 100, log(i))\n"), output=BufferedSink(stream)).run()
+    assert stream.getvalue() == "".join(f"{i}\n" for i in range(100))
+    assert stream.writes == 1
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_output_is_flushed_before_errors(engine):
+    stream = io.StringIO()
+    with pytest.raises(FclRuntimeError):
+        engine(parse("log(\"before\")\nlog(nope)\n"), output=BufferedSink(stream)).run()
+    assert stream.getvalue() == "before\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_error_message_follows_the_output(fcl, engine):
+    result, out = fcl("log(\"before\")\nlog(nope)\n", engine)
+    assert out == f"before\n{result.error.message}\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_memory_sink(engine):
+    sink = MemorySink()
+    engine(parse("log(1, \"a\", [2, 3])\n"), output=sink).run()
+    assert sink.getvalue() == "1 a [2, 3]\n"
+    sink.clear()
+    assert sink.getvalue() == ""
@@ -0,0 +1,35 @@
+import pytest
+
+from conftest import ENGINES
+from language import *
+
+
+@pytest.fixture
+def two_workers():
+    previous = Interpreter.pfor_workers
+    Interpreter.pfor_workers = 2
+    yield
+    Interpreter.pfor_workers = previous
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pfor_workers_get_their_own_inline_caches(fcl, two_workers, engine):
+    code = "for(j, 1, 3, (r = pfor(i, 0, j, (a = add(i, 10), b = sub(i, 10), mul(a, b))), log(j, r)))\n"
+    result, out = fcl(code, engine)
+    assert result.ok
+    assert out == "1 [-100]\n2 [-100, -99]\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pfor_foreach_over_outer_variable(fcl, two_workers, engine):
+    result, out = fcl("x = 5\npfor(i, 0, 2, foreach(x, [1, 2], log(x)))\nlog(x)\n", engine)
+    assert isinstance(result.error, FclRuntimeError)
+    assert out.startswith("'pfor' body can't assign variables defined outside of it")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pfor_foreach(fcl, two_workers, engine):
+    code = "log(pfor(i, 0, 3, (s = 0, foreach(v, range(i), s = add(s, v)), s)))\n"
+    result, out = fcl(code, engine)
+    assert result.ok
+    assert out == "[0, 0, 1]\n"
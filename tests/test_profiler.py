@@ -0,0 +1,60 @@
+import io
+import itertools
+
+import pytest
+
+from language import *
+
+
+def profile(code: str) -> Profiler:
+    lexer = Lexer(code, "<test>")
+    lexer.tokenize()
+    # every reading of the clock is one second later
+    profiler = Profiler(clock=itertools.count().__next__)
+    output = io.StringIO()
+    ProfilingInterpreter(Parser(lexer).parse(), output=output, profiler=profiler).run()
+    assert output.getvalue() == "0\n1\n2\ndone\n"
+    return profiler
+
+
+CODE = "for(i, 0, 3, log(i))\nlog(\"done\")\n"
+
+
+def test_calls_by_builtin_and_line():
+    profiler = profile(CODE)
+    assert {name: stats.calls for name, stats in profiler.builtins.items()} == {"for": 1, "log": 4}
+    assert {line: stats.calls for line, stats in profiler.lines.items()} == {("<test>", 1): 4, ("<test>", 2): 1}
+
+    # each log reads the clock twice, 'for' spans its three logs
+    log, loop = profiler.builtins["log"], profiler.builtins["for"]
+    assert log.total == log.self_time == 4
+    assert loop.total == 7 and loop.self_time == 4
+    # a line's calls nested in each other are counted once in its total
+    assert profiler.lines[("<test>", 1)].total == 7
+
+
+def test_collapsed_stacks():
+    assert sorted(profile(CODE).collapsed().splitlines()) == [
+        "for (<test>:1) 4000000",
+        "for (<test>:1);log (<test>:1) 3000000",
+        "log (<test>:2) 1000000",
+    ]
+
+
+def test_report():
+    profiler = profile(CODE)
+    lines = profiler.report(sort="calls").splitlines()
+    assert lines[0].endswith("builtin") and lines[1].endswith("log") and lines[2].endswith("for")
+    assert lines[4].endswith("line") and lines[5].endswith("<test>:1")
+    with pytest.raises(ValueError, match="unknown sort key"):
+        profiler.report(sort="name")
+
+
+def test_profiled_errors_unwind_the_stack():
+    lexer = Lexer("for(i, 0, 3, log(div(1, sub(1, i))))\n", "<test>")
+    lexer.tokenize()
+    profiler = Profiler()
+    with pytest.raises(FclRuntimeError):
+        ProfilingInterpreter(Parser(lexer).parse(), output=io.StringIO(), profiler=profiler).run()
+    assert profiler.stack == []
+    assert profiler.builtins["div"].calls == 2
@@ -0,0 +1,55 @@
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+
+def test_rope_branches_keep_their_own_text():
+    base = concat("a" * 300, "b")
+    assert type(base) is Rope and len(base) == 301
+    left = base.append("L")
+    right = base.append(concat("R", "r"))
+    # appending to a rope that isn't the newest one copies its parts
+    assert str(right) == "a" * 300 + "bRr"
+    assert str(left) == "a" * 300 + "bL"
+    assert str(base) == "a" * 300 + "b"
+    assert left.append(left) == str(left) * 2
+    assert base == "a" * 300 + "b" and base != "a" * 301
+    assert base[300] == "b" and list(base)[-1] == "b"
+
+
+def test_short_strings_stay_strings():
+    assert concat("ab", "cd") == "abcd" and type(concat("ab", "cd")) is str
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("optimizer", [None, Optimizer()], ids=["plain", "optimized"])
+def test_ropes(fcl, engine, optimizer):
+    code = """s = ""
+for(i, 0, 2000, s = add(s, "ab"))
+log(len(s), index(s, 3999), index(s, 0))
+t = s
+s = add(s, "X")
+t = add(t, "Y")
+log(len(s), len(t), index(s, 4000), index(t, 4000))
+log(eq(s, t), eq(str(s), s), neq(s, t), eq(add(t, ""), t))
+u = concat("a", "b", str(1), s)
+log(len(u), index(u, 2), concat("a", "b", "c"))
+log(join(["x", "y", "z"], ", "), join([], "-"), len(join([s, "!"], "")))
+foreach(c, concat("ab", "cd"), log(c))
+log(eq(add(s, s), concat(s, s)), max(["b", s]), add("he", "llo"))
+"""
+    result, out = fcl(code, engine, optimizer)
+    assert result.ok, result.error
+    assert out.split("\n") == [
+        "4000 b a", "4001 4001 X Y", "false true true true", "4004 1 abc", "x, y, z  4002",
+        "a", "b", "c", "d", "true b hello", "",
+    ]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_rope_errors(fcl, engine):
+    result, _ = fcl("log(concat(\"a\", 1))\n", engine)
+    assert "'concat' function only takes strings" in result.error.message
+    result, _ = fcl("log(join([\"a\", 1], \"\"))\n", engine)
+    assert isinstance(result.error, FclRuntimeError)
@@ -0,0 +1,82 @@
+import io
+import sys
+import threading
+
+import pytest
+from conftest import ENGINES
+
+from language import *
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_concurrent_runs_keep_their_output(engine):
+    barrier = threading.Barrier(2, timeout=10)
+    registry = BUILTINS.copy()
+    registry.register("wait", lambda interp, args, node: barrier.wait(), arity=0)
+    streams = [io.StringIO() for _ in range(2)]
+    results = [None, None]
+
+    def run(i: int):
+        code = f'log("run {i} starts")\nwait()\nlog("run {i} ends")\n'
+        results[i] = run_source(code, engine=engine, builtins=registry, stdout=streams[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i in range(2):
+        assert streams[i].getvalue() == f"run {i} starts\nrun {i} ends\n"
+        assert results[i].ok
+        assert results[i].metrics.log_bytes == len(streams[i].getvalue())
+
+
+def test_sys_stdout_is_left_alone():
+    seen = []
+    registry = BUILTINS.copy()
+    registry.register("peek", lambda interp, args, node: seen.append(sys.stdout), arity=0)
+    stdout = sys.stdout
+    run_source("peek()\n", builtins=registry, stdout=io.StringIO())
+    assert seen == [stdout]
+
+
+def test_input_prompt_goes_to_the_run_stdout(fcl, monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", io.StringIO("fcl\n"))
+    result, out = fcl('log("hi")\nlog(input("name? "))\n')
+    assert out == "hi\nname? fcl\n"
+    assert capsys.readouterr().out == ""
+
+
+def test_callback_sees_errors(fcl):
+    results = []
+    stdout = io.StringIO()
+    result = run_source("log(div(1, 0))\n", "<test>", stdout=stdout, callback=results.append)
+    assert results == [result]
+    assert result.exit_code == 1 and isinstance(result.error, FclRuntimeError)
+    assert "cannot divide by zero" in stdout.getvalue()
+
+
+def test_callback_runs_on_unexpected_exceptions():
+    def crash(interp, args, node):
+        raise KeyError("bug")
+
+    registry = BUILTINS.copy()
+    registry.register("crash", crash, arity=0)
+    results = []
+    with pytest.raises(KeyError):
+        run_source('log("before")\ncrash()\n', builtins=registry, stdout=io.StringIO(), callback=results.append)
+    assert len(results) == 1
+    assert results[0].exit_code == 1 and not results[0].ok
+    assert results[0].metrics.log_bytes == len("before\n")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_metrics(fcl, engine):
+    result, out = fcl("x = 0\nfor (i, 0, 3, x = add(x, i))\nlog(x)\n", engine)
+    assert out == "3\n"
+    assert result.ok and result.exit_code == 0
+    assert result.metrics.tokens > 0 and result.metrics.nodes > 0
+    assert result.metrics.log_bytes == 2
+    if engine is Interpreter:
+        assert result.metrics.loop_iterations == 3
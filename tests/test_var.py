@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import ENGINES
+from language import *
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_var_reading_itself(fcl, engine):
+    result, out = fcl("var(x, if(true, 1, x))\nlog(x)\nlog(x)\n", engine)
+    assert result.ok
+    assert out == "1\n1\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_vars_reading_each_other(fcl, engine):
+    code = "var(x, if(true, 1, y))\nvar(y, if(true, 2, x))\nlog(x, y)\nlog(x, y)\n"
+    result, out = fcl(code, engine)
+    assert result.ok
+    assert out == "1 2\n1 2\n"
+
+
+def test_stream_keeps_no_var_statements(tmp_path):
+    path = tmp_path / "vars.fcl"
+    path.write_text("".join(f"var(v{i % 5}, add({i}, 1))\nlog(v{i % 5})\n" for i in range(100)))
+    parser = Parser(StreamLexer(str(path)))
+    parser.start()
+    output = MemorySink()
+    interp = Interpreter(Program(parser.current_token), output=output)
+    interp.run_stream(parser.statements())
+    assert output.getvalue().split() == [str(i + 1) for i in range(100)]
+    assert interp.var_slots == {}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_var_is_lazy(fcl, engine):
+    code = "var(y, add(x, 1))\nz = var(w, (log(\"computed\"), 2))\nlog(\"bound\")\nx = 5\nlog(y, z, w)\nx = 10\nlog(y, z)\n"
+    result, out = fcl(code, engine)
+    assert result.ok, result.error
+    assert out == "bound\ncomputed\n6 2 2\n11 2\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_var_needing_its_own_value(fcl, engine):
+    result, out = fcl("var(x, add(x, 1))\nlog(x)\n", engine)
+    assert isinstance(result.error, FclRuntimeError)
+    assert out.startswith("'var' expression needs its own value")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_var_reading_a_var_forced_again(fcl, engine):
+    code = "x = 1\nvar(y, add(x, 1))\nvar(z, mul(y, 2))\nlog(z)\nx = 5\nlog(y)\nlog(z)\n"
+    result, out = fcl(code, engine)
+    assert result.ok, result.error
+    assert out == "4\n6\n12\n"